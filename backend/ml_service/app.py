@@ -1,15 +1,131 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from fake_review_detector import FakeReviewDetector
+from werkzeug.exceptions import BadRequest
+from fake_review_detector import get_detector
+from jobs import JobManager
+from scheduler import DeadlineExceeded, InferenceScheduler, PRIORITY_CLASSES
+from shadow import ShadowScorer
+from profiler import ProfileCoordinator
+from warmup import Readiness
+import serialization
+import tracing
+import atexit
 import json
+import math
 import os
+import time
 from datetime import datetime
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize the detector
-detector = FakeReviewDetector()
+# Initialize the detector (shared by all request threads)
+detector = get_detector()
+
+# Candidate model bundle scored off the response path (SHADOW_MODELS_DIR)
+shadow = ShadowScorer.from_env()
+
+# Interactive and bulk scoring share the workers through one priority queue
+scheduler = InferenceScheduler(detector, shadow=shadow)
+
+# Long-running batch and seller-risk work, persisted in SQLite
+jobs = JobManager(detector, scheduler)
+
+# Warm-up state for /ready; gunicorn warms up in post_worker_init, the
+# development server on a background thread (see warmup.py)
+readiness = Readiness()
+
+def save_reviewer_index():
+    if detector.reviewer_index is not None:
+        detector.reviewer_index.save(detector.reviewer_index_path)
+
+def save_semantic_index():
+    if detector.semantic_index is not None:
+        detector.semantic_index.save(detector.semantic_index_path)
+
+atexit.register(save_reviewer_index)
+atexit.register(save_semantic_index)
+
+# Workers exchange reviewer history and semantic index vectors through the shared files
+if detector.reviewer_index is not None:
+    detector.reviewer_index.start_syncing(detector.reviewer_index_path)
+if detector.semantic_index is not None:
+    detector.semantic_index.start_syncing(detector.semantic_index_path)
+
+# Every worker merges its OOV counts into one file (flock'd, see vocabulary.py)
+oov_counts_path = os.environ.get('OOV_COUNTS_PATH', os.path.join(detector.models_dir, 'oov_counts.json'))
+detector.oov_tracker.start_flushing(oov_counts_path)
+atexit.register(detector.oov_tracker.dump, oov_counts_path)
+
+# Every worker watches for /debug/profile requests (see profiler.py)
+profiler = ProfileCoordinator()
+profiler.start()
+
+@app.before_request
+def start_trace():
+    """Trace /predict requests that ask for it (X-Profile) or are sampled"""
+    if request.path.startswith('/predict/') and tracing.should_trace(request.headers.get('X-Profile')):
+        g.trace, g.trace_token = tracing.begin(f"{request.method} {request.path}")
+
+@app.after_request
+def finish_trace(response):
+    trace = g.get('trace')
+    if trace is not None:
+        trace.add(trace.name, trace.started, time.monotonic(), {'status': response.status_code})
+        try:
+            trace.write()
+            response.headers['X-Trace-Id'] = trace.id
+        except Exception as e:
+            print(f"Error writing trace: {e}")
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    token = g.get('trace_token')
+    if token is not None:
+        tracing.end(token)
+
+def request_priority(default):
+    """Priority class from the X-Priority header.
+
+    Callers may only lower their priority: batch endpoints default to bulk
+    and cannot move uploads into the interactive class.
+    """
+    priority = request.headers.get('X-Priority', default)
+    if priority not in PRIORITY_CLASSES or PRIORITY_CLASSES[priority] < PRIORITY_CLASSES[default]:
+        return default
+    return priority
+
+def request_deadline_ms():
+    """Relative deadline from the X-Deadline-Ms header, if any"""
+    value = request.headers.get('X-Deadline-Ms')
+    if not value:
+        return None
+    try:
+        deadline_ms = float(value)
+    except ValueError:
+        deadline_ms = None
+    if deadline_ms is None or not math.isfinite(deadline_ms) or deadline_ms <= 0:
+        raise BadRequest(f"Invalid X-Deadline-Ms header: {value!r}")
+    return deadline_ms
+
+def bad_request_response(e):
+    return jsonify({
+        'success': False,
+        'error': e.description
+    }), 400
+
+def deadline_exceeded_response(e):
+    return jsonify({
+        'success': False,
+        'error': str(e)
+    }), 504
+
+def encoded_response(payload, mimetype, status=200):
+    """Encode a payload in the negotiated format"""
+    with tracing.span('serialize'):
+        body = serialization.encode(payload, mimetype)
+    return Response(body, status=status, mimetype=mimetype)
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -20,23 +136,51 @@ def health_check():
         'models_loaded': len(detector.models) > 0
     })
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until warm-up has succeeded with the models loaded"""
+    models_loaded = len(detector.models) > 0
+    ready = readiness.ready and models_loaded
+    return jsonify({
+        'ready': ready,
+        'service': 'fake-review-detector',
+        'models_loaded': models_loaded,
+        'warmup': readiness.snapshot()
+    }), 200 if ready else 503
+
 @app.route('/predict/review', methods=['POST'])
 def predict_review():
     """Predict if a review is fake and analyze patterns"""
     try:
-        data = request.get_json()
+        with tracing.span('parse'):
+            data = request.get_json()
         
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
+        mimetype = serialization.negotiate(request.accept_mimetypes)
+        fields = serialization.parse_fields(request.args.get('fields'))
+        
         # Process the review
-        result = detector.process_review(data)
+        result = scheduler.run([data], request_priority('interactive'), request_deadline_ms())[0]
+        predictions = serialization.project(result, fields, mimetype in serialization.COMPACT_FORMATS)
         
-        return jsonify({
+        if mimetype == serialization.COLUMNAR:
+            # Same shape as /predict/batch, with one row
+            return encoded_response({
+                'success': True,
+                'results': serialization.to_columnar([{'reviewId': data.get('reviewId'), 'predictions': predictions}], fields)
+            }, mimetype)
+        
+        return encoded_response({
             'success': True,
-            'predictions': result
-        })
+            'predictions': predictions
+        }, mimetype)
         
+    except BadRequest as e:
+        return bad_request_response(e)
+    except DeadlineExceeded as e:
+        return deadline_exceeded_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -47,26 +191,42 @@ def predict_review():
 def predict_batch():
     """Process multiple reviews in batch"""
     try:
-        data = request.get_json()
+        with tracing.span('parse'):
+            data = request.get_json()
         
         if not data or 'reviews' not in data:
             return jsonify({'error': 'No reviews data provided'}), 400
         
+        mimetype = serialization.negotiate(request.accept_mimetypes)
+        fields = serialization.parse_fields(request.args.get('fields'))
+        compact = mimetype in serialization.COMPACT_FORMATS
+        
         reviews = data['reviews']
         results = []
         
-        for review in reviews:
-            result = detector.process_review(review)
+        # Scored in micro-batches that yield to interactive requests
+        predictions = scheduler.run(reviews, request_priority('bulk'), request_deadline_ms())
+        for review, result in zip(reviews, predictions):
             results.append({
                 'reviewId': review.get('reviewId'),
-                'predictions': result
+                'predictions': serialization.project(result, fields, compact)
             })
         
-        return jsonify({
+        if mimetype == serialization.COLUMNAR:
+            return encoded_response({
+                'success': True,
+                'results': serialization.to_columnar(results, fields)
+            }, mimetype)
+        
+        return encoded_response({
             'success': True,
             'results': results
-        })
+        }, mimetype)
         
+    except BadRequest as e:
+        return bad_request_response(e)
+    except DeadlineExceeded as e:
+        return deadline_exceeded_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -98,11 +258,183 @@ def models_status():
             'error': str(e)
         }), 500
 
+@app.route('/metrics/scheduler', methods=['GET'])
+def scheduler_metrics():
+    """Queue depth and per-class latency of the scoring scheduler"""
+    return jsonify({
+        'success': True,
+        'scheduler': scheduler.metrics()
+    })
+
+@app.route('/cascade/stats', methods=['GET'])
+def cascade_stats():
+    """Escalation rate and stage-1/LSTM agreement of the cascade"""
+    if detector.cascade is None:
+        return jsonify({
+            'success': True,
+            'enabled': False
+        })
+
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'bands': {head: list(band) for head, band in detector.cascade.bands.items()},
+        'audit_rate': detector.cascade.audit_rate,
+        'stats': detector.cascade.stats.snapshot()
+    })
+
+@app.route('/reviewers/<reviewer_id>', methods=['GET'])
+def reviewer_stats(reviewer_id):
+    """Accumulated stats and credibility for one reviewer"""
+    stats = detector.reviewer_index.lookup(reviewer_id) if detector.reviewer_index is not None else None
+    if stats is None:
+        return jsonify({'success': False, 'error': 'Reviewer not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'reviewerId': reviewer_id,
+        'stats': stats,
+        'reviewerCredibility': detector.calculate_reviewer_credibility(stats)
+    })
+
+@app.route('/reviewers/index/save', methods=['POST'])
+def reviewer_index_save():
+    """Persist the reviewer index to disk"""
+    try:
+        save_reviewer_index()
+
+        return jsonify({
+            'success': True,
+            'path': detector.reviewer_index_path,
+            'reviewers': len(detector.reviewer_index) if detector.reviewer_index is not None else 0
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/semantic/stats', methods=['GET'])
+def semantic_stats():
+    """Size of the semantic duplicate index"""
+    if detector.semantic_index is None:
+        return jsonify({'success': True, 'enabled': False})
+
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'index': detector.semantic_index.stats()
+    })
+
+@app.route('/semantic/index/save', methods=['POST'])
+def semantic_index_save():
+    """Persist the semantic duplicate index to disk"""
+    try:
+        save_semantic_index()
+
+        return jsonify({
+            'success': True,
+            'path': detector.semantic_index_path,
+            'index': detector.semantic_index.stats() if detector.semantic_index is not None else None
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """Sample every worker's stacks for N seconds; returns collapsed stacks"""
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        seconds = min(max(seconds, 1), profiler.max_seconds)
+        profile_id = profiler.request(seconds)
+        collapsed, workers = profiler.collect(profile_id, seconds)
+
+        response = Response(collapsed, mimetype='text/plain')
+        response.headers['X-Profile-Workers'] = ','.join(workers)
+        return response
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/shadow/stats', methods=['GET'])
+def shadow_stats():
+    """Counters of the shadow scorer; compare bundles with `python shadow.py report`"""
+    if shadow is None:
+        return jsonify({'success': True, 'enabled': False})
+
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'shadow': shadow.stats()
+    })
+
+@app.route('/collusion/stats', methods=['GET'])
+def collusion_stats():
+    """Size of the reviewer/IP/product/seller graph"""
+    if detector.collusion_graph is None:
+        return jsonify({'success': True, 'enabled': False})
+
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'graph': detector.collusion_graph.stats()
+    })
+
+@app.route('/vocabulary/oov', methods=['GET'])
+def vocabulary_oov():
+    """Most frequent out-of-vocabulary words this worker saw since its last flush"""
+    try:
+        limit = int(request.args.get('limit', 100))
+        snapshot = detector.oov_tracker.snapshot()
+
+        return jsonify({
+            'success': True,
+            'total_observed': snapshot['total_observed'],
+            'distinct_words': len(snapshot['counts']),
+            'words': [
+                {'word': word, 'count': count}
+                for word, count in detector.oov_tracker.most_common(limit)
+            ]
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/vocabulary/oov/dump', methods=['POST'])
+def vocabulary_oov_dump():
+    """Flush this worker's OOV counts now; workers also flush periodically and at exit"""
+    try:
+        observed = detector.oov_tracker.dump(oov_counts_path)
+
+        return jsonify({
+            'success': True,
+            'path': oov_counts_path,
+            'observed': observed
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/predict/seller-risk', methods=['POST'])
 def predict_seller_risk():
     """Calculate seller risk score based on all their reviews"""
     try:
-        data = request.get_json()
+        with tracing.span('parse'):
+            data = request.get_json()
         seller_reviews = data.get('reviews', [])
         seller_id = data.get('sellerId', 'unknown')
         
@@ -123,7 +455,9 @@ def predict_seller_risk():
             })
         
         # Calculate seller risk score
-        risk_assessment = detector.calculate_seller_risk_score(seller_reviews)
+        predictions = scheduler.run(seller_reviews, request_priority('bulk'), request_deadline_ms())
+        with tracing.span('seller_risk'):
+            risk_assessment = detector.calculate_seller_risk_score(seller_reviews, predictions, seller_id)
         
         return jsonify({
             'success': True,
@@ -131,12 +465,127 @@ def predict_seller_risk():
             'risk_assessment': risk_assessment
         })
         
+    except BadRequest as e:
+        return bad_request_response(e)
+    except DeadlineExceeded as e:
+        return deadline_exceeded_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/jobs/batch', methods=['POST'])
+def submit_batch_job():
+    """Queue a batch of reviews for asynchronous scoring"""
+    try:
+        data = request.get_json()
+        
+        if not data or 'reviews' not in data:
+            return jsonify({'error': 'No reviews data provided'}), 400
+        
+        job_id = jobs.submit('batch', data['reviews'])
+        
+        return jsonify({
+            'success': True,
+            'jobId': job_id,
+            'status': jobs.status(job_id)
+        }), 202
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/jobs/seller-risk', methods=['POST'])
+def submit_seller_risk_job():
+    """Queue an asynchronous seller risk assessment"""
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get('reviews'):
+            return jsonify({'error': 'No reviews data provided'}), 400
+        
+        job_id = jobs.submit('seller-risk', data['reviews'], {'sellerId': data.get('sellerId', 'unknown')})
+        
+        return jsonify({
+            'success': True,
+            'jobId': job_id,
+            'status': jobs.status(job_id)
+        }), 202
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status and progress of a job"""
+    status = jobs.status(job_id)
+    if status is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'status': status
+    })
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    if jobs.status(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'cancelled': jobs.cancel(job_id),
+        'status': jobs.status(job_id)
+    })
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """Scored results of a job, one page at a time"""
+    try:
+        status = jobs.status(job_id)
+        if status is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        # SQLite reads a negative LIMIT as no limit
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+        payload = {
+            'success': True,
+            'status': status,
+            'offset': offset,
+            'results': jobs.results_page(job_id, offset, limit)
+        }
+        if status['kind'] == 'seller-risk':
+            payload['risk_assessment'] = jobs.result(job_id)
+        
+        return jsonify(payload)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+def job_stream(job_id):
+    """Stream results as NDJSON while the job runs"""
+    if jobs.status(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    def generate():
+        for row in jobs.stream(job_id):
+            yield serialization.dumps_json(row) + b'\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
+    readiness.start(detector, scheduler.micro_batch_size)
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
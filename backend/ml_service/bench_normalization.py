@@ -0,0 +1,115 @@
+"""
+Throughput of the text normalization pipeline against the old split-based
+feature extraction.
+
+    python bench_normalization.py --reviews 50000 --repeat-fraction 0.3
+
+The legacy path is the previous analyze_text_patterns (str.lower, split on
+whitespace and '.'). The new path is analyze_text_patterns on top of
+text_normalization.normalize, measured with a cold cache and again with a
+warm one (only non-ASCII text is cached), on the whole corpus and on its
+ASCII reviews alone. The corpus mixes plain English, '!'/'?' endings, emoji,
+full-width punctuation and CJK text; --repeat-fraction controls how many
+reviews are verbatim repeats (bot text, re-scored reviews).
+"""
+
+import argparse
+import random
+import time
+
+from fake_review_detector import analyze_text_patterns
+from text_normalization import cache_clear, cache_info, normalize
+
+SUSPICIOUS_PHRASES = [
+    'great product', 'fast shipping', 'excellent quality', 'highly recommend',
+    'would buy again', 'perfect transaction', 'amazing service', 'best purchase',
+    'love it', 'excellent product', 'great service', 'fast delivery',
+    'good quality', 'satisfied with', 'recommend to friends', 'thank you seller'
+]
+GENERIC_WORDS = ['good', 'great', 'excellent', 'amazing', 'perfect', 'best', 'love', 'recommend']
+
+TEMPLATES = [
+    "Great product! Fast shipping. Would buy again!!!",
+    "The battery lasts about two days with heavy use. Setup was easy, the app less so. Overall decent value?",
+    "Love it 😍😍 best purchase this year! Highly recommend 👍",
+    "Ｇｒｅａｔ ｑｕａｌｉｔｙ！Ｆａｓｔ ｄｅｌｉｖｅｒｙ！",
+    "すごく良い商品です。また買います！",
+    "质量很好，物流很快。推荐给朋友！",
+    "It broke after a week… customer service didn’t reply. Terrible experience, worst seller.",
+    "Good. Good. Good. Good value, good quality, good seller."
+]
+
+
+def legacy_analyze_text_patterns(review_text):
+    """analyze_text_patterns before text_normalization"""
+    text_lower = review_text.lower()
+    words = text_lower.split()
+    word_counts = {}
+    for word in words:
+        word_counts[word] = word_counts.get(word, 0) + 1
+    total_words = len(words)
+    unique_words = len(word_counts)
+    sentence_start_words = []
+    for sentence in review_text.split('.'):
+        if sentence.strip():
+            sentence_start_words.append(sentence.strip().split()[0].lower())
+    return {
+        'repetition_score': 1 - (unique_words / total_words) if total_words > 0 else 0,
+        'suspicious_phrase_count': sum(1 for phrase in SUSPICIOUS_PHRASES if phrase in text_lower),
+        'exclamation_count': text_lower.count('!'),
+        'generic_word_count': sum(1 for word in GENERIC_WORDS if word in text_lower),
+        'repeated_starters': len(sentence_start_words) - len(set(sentence_start_words)),
+        'total_words': total_words,
+        'unique_words': unique_words
+    }
+
+
+def make_corpus(size, repeat_fraction, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        if corpus and rng.random() < repeat_fraction:
+            corpus.append(rng.choice(corpus))
+        else:
+            # Unique suffix so non-repeated reviews miss the cache
+            corpus.append(f"{rng.choice(TEMPLATES)} {rng.choice(TEMPLATES)} order {i}")
+    return corpus
+
+
+def throughput(function, corpus):
+    start = time.perf_counter()
+    for text in corpus:
+        function(text)
+    return len(corpus) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark text normalization against the split-based code')
+    parser.add_argument('--reviews', type=int, default=50000)
+    parser.add_argument('--repeat-fraction', type=float, default=0.3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.reviews, args.repeat_fraction)
+
+    legacy = throughput(legacy_analyze_text_patterns, corpus)
+    cache_clear()
+    cold = throughput(analyze_text_patterns, corpus)
+    warm = throughput(analyze_text_patterns, corpus)
+    normalize_only = throughput(normalize, corpus)
+    ascii_corpus = [text for text in corpus if text.isascii()]
+    ascii_legacy = throughput(legacy_analyze_text_patterns, ascii_corpus)
+    ascii_new = throughput(analyze_text_patterns, ascii_corpus)
+
+    print(f"{args.reviews} reviews, {args.repeat_fraction:.0%} repeats")
+    print(f"  legacy split-based       {legacy:12,.0f} reviews/s")
+    print(f"  normalized (cold cache)  {cold:12,.0f} reviews/s  ({cold / legacy:.2f}x)")
+    print(f"  normalized (warm cache)  {warm:12,.0f} reviews/s  ({warm / legacy:.2f}x)")
+    print(f"  normalize() only         {normalize_only:12,.0f} reviews/s")
+    print(f"  ASCII reviews ({len(ascii_corpus)}):")
+    print(f"    legacy split-based     {ascii_legacy:12,.0f} reviews/s")
+    print(f"    normalized             {ascii_new:12,.0f} reviews/s  ({ascii_new / ascii_legacy:.2f}x)")
+    print(f"  non-ASCII cache: {cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
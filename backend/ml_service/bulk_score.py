@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Offline bulk scoring for the full review table.
+
+Reads Parquet, Arrow IPC or CSV input chunk by chunk (Parquet row groups,
+Arrow record batches, CSV blocks), scores every chunk with the vectorized
+FakeReviewDetector.process_reviews path on a pool of worker processes and
+writes the input columns plus prediction columns to one Parquet part file
+per chunk:
+
+    python bulk_score.py reviews.parquet --output scored/ --workers 4
+
+Parquet row groups and Arrow IPC file batches are addressed by index: the
+parent only sends (path, index) and each worker reads its chunk itself
+(IPC files through a memory map). CSV blocks and Arrow streams can only be
+read in order, so the parent reads them and ships each chunk to a worker as
+a serialized IPC buffer through the pool pipe. Either way the worker turns
+the review columns into Python dicts for the detector; only the numeric
+prediction columns go to Arrow straight from NumPy.
+
+Workers score with reviewer tracking off (no reviewer index, collusion
+graph or semantic index), so the output does not depend on how chunks were
+spread over processes or on earlier runs; reviewerCredibility only reflects
+each review's own fields.
+
+Part files are written atomically, so an interrupted run picks up where it
+stopped when started again with the same arguments. Finished chunks of
+Parquet and Arrow IPC files are skipped without being read.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Review fields the detector reads, passed through from the input when present
+REVIEW_FIELDS = ['reviewId', 'reviewText', 'rating', 'reviewDate', 'ipAddress',
+                 'verifiedPurchase', 'accountAgeDays', 'reviewerId', 'productId', 'sellerId']
+
+# Scalar prediction fields written as output columns
+PREDICTION_COLUMNS = {
+    'isFake': pa.bool_(),
+    'confidence': pa.float32(),
+    'riskScore': pa.float32(),
+    'sentiment': pa.string(),
+    'sentimentScore': pa.float32(),
+    'reviewAuthenticity': pa.float32(),
+    'reviewerCredibility': pa.float32(),
+    'burstReviewDetected': pa.bool_(),
+    'burstReviewConfidence': pa.float32(),
+    'copyPasteDetected': pa.bool_(),
+    'copyPasteConfidence': pa.float32(),
+    'botActivityDetected': pa.bool_(),
+    'botActivityConfidence': pa.float32()
+}
+
+# Formats whose chunks can be read by index
+PARQUET_FORMATS = ('.parquet', '.pq')
+IPC_FILE_FORMATS = ('.arrow', '.feather', '.ipc')
+
+_worker_detector = None
+
+
+def is_random_access(path):
+    return os.path.splitext(path)[1].lower() in PARQUET_FORMATS + IPC_FILE_FORMATS
+
+
+def chunk_count(path):
+    """Number of row groups or record batches of a random-access input"""
+    if os.path.splitext(path)[1].lower() in PARQUET_FORMATS:
+        return pq.ParquetFile(path).num_row_groups
+    return pa.ipc.open_file(pa.memory_map(path)).num_record_batches
+
+
+def read_chunk(path, index):
+    """Read one chunk of a random-access input"""
+    if os.path.splitext(path)[1].lower() in PARQUET_FORMATS:
+        return pq.ParquetFile(path).read_row_group(index)
+    return pa.ipc.open_file(pa.memory_map(path)).get_batch(index)
+
+
+def iter_chunks(path, csv_block_size=16 << 20):
+    """Yield (chunk_index, Table or RecordBatch) in a deterministic order"""
+    ext = os.path.splitext(path)[1].lower()
+    if is_random_access(path):
+        for i in range(chunk_count(path)):
+            yield i, read_chunk(path, i)
+    elif ext == '.arrows':
+        for i, batch in enumerate(pa.ipc.open_stream(pa.memory_map(path))):
+            yield i, batch
+    elif ext == '.csv':
+        reader = pa_csv.open_csv(path, read_options=pa_csv.ReadOptions(block_size=csv_block_size))
+        for i, batch in enumerate(reader):
+            yield i, batch
+    else:
+        raise ValueError(f"Unsupported input format: {ext}")
+
+
+def serialize_chunk(chunk):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, chunk.schema) as writer:
+        writer.write(chunk)
+    return sink.getvalue()
+
+
+def deserialize_chunk(buffer):
+    # read_all() references the IPC buffer instead of copying it
+    return pa.ipc.open_stream(buffer).read_all()
+
+
+def part_path(output_dir, index):
+    return os.path.join(output_dir, f"part-{index:05d}.parquet")
+
+
+def _init_worker(models_dir):
+    global _worker_detector
+    from fake_review_detector import FakeReviewDetector
+    # Reviewer history and semantic duplicates would depend on which chunks
+    # each process happened to score; bulk output must be reproducible
+    _worker_detector = FakeReviewDetector(models_dir, track_reviewers=False)
+
+
+def predictions_to_arrays(predictions):
+    """Build one Arrow array per prediction field.
+
+    Default predictions (models failed for a review) lack some fields, such
+    as sentiment; those rows get nulls.
+    """
+    arrays = []
+    for name, arrow_type in PREDICTION_COLUMNS.items():
+        values = [prediction.get(name) for prediction in predictions]
+        if any(value is None for value in values):
+            arrays.append(pa.array(values, type=arrow_type))
+        elif pa.types.is_floating(arrow_type):
+            arrays.append(pa.array(np.asarray(values, dtype=np.float32)))
+        elif pa.types.is_boolean(arrow_type):
+            arrays.append(pa.array(np.asarray(values, dtype=np.bool_)))
+        else:
+            arrays.append(pa.array(values, type=arrow_type))
+    return arrays
+
+
+def score_chunk(source, text_column, output_path, batch_size):
+    """Worker entry point: score one chunk and write its part file.
+
+    source is (input path, chunk index) for random-access inputs and a
+    serialized IPC buffer otherwise.
+    """
+    chunk = read_chunk(*source) if isinstance(source, tuple) else deserialize_chunk(source)
+    if isinstance(chunk, pa.RecordBatch):
+        # Arrow IPC files are read batch by batch; the Parquet writer takes tables
+        chunk = pa.Table.from_batches([chunk])
+    table = chunk
+    if text_column != 'reviewText' and text_column in table.column_names:
+        table = table.rename_columns(['reviewText' if name == text_column else name for name in table.column_names])
+
+    fields = [name for name in REVIEW_FIELDS if name in table.column_names]
+    reviews = table.select(fields).to_pylist()
+
+    predictions = []
+    for start in range(0, len(reviews), batch_size):
+        predictions.extend(_worker_detector.process_reviews(reviews[start:start + batch_size]))
+
+    output = chunk
+    for name, array in zip(PREDICTION_COLUMNS, predictions_to_arrays(predictions)):
+        if name in output.column_names:
+            output = output.drop_columns([name])
+        output = output.append_column(name, array)
+
+    tmp_path = output_path + '.tmp'
+    pq.write_table(output, tmp_path)
+    os.replace(tmp_path, output_path)
+    return chunk.num_rows
+
+
+def bulk_score(input_path, output_dir, models_dir='./ml_models', workers=None,
+               batch_size=512, text_column='reviewText'):
+    """Score every chunk of input_path that has no part file yet"""
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    # TensorFlow is not fork-safe, so workers always start fresh
+    context = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+    rows_done = 0
+    skipped = 0
+    last_report = start
+
+    if is_random_access(input_path):
+        # Workers read their own chunk; finished chunks are never read
+        sources = ((index, (input_path, index)) for index in range(chunk_count(input_path)))
+    else:
+        sources = iter_chunks(input_path)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(models_dir,)) as pool:
+        pending = set()
+        for index, source in sources:
+            output_path = part_path(output_dir, index)
+            if os.path.exists(output_path):
+                skipped += 1
+                continue
+
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                rows_done += sum(future.result() for future in done)
+
+            if not isinstance(source, tuple):
+                source = serialize_chunk(source)
+            pending.add(pool.submit(score_chunk, source, text_column, output_path, batch_size))
+
+            now = time.perf_counter()
+            if now - last_report >= 10:
+                print(f"{rows_done} rows scored, {rows_done / (now - start):.1f} rows/s")
+                last_report = now
+
+        for future in pending:
+            rows_done += future.result()
+
+    elapsed = time.perf_counter() - start
+    with open(os.path.join(output_dir, '_SUCCESS'), 'w') as f:
+        f.write(f"{rows_done} rows in {elapsed:.1f}s\n")
+
+    print(f"Scored {rows_done} rows in {elapsed:.1f}s ({rows_done / elapsed if elapsed else 0:.1f} rows/s); "
+          f"{skipped} chunks already done")
+    return rows_done
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a review table offline and write predictions as Parquet')
+    parser.add_argument('input', help='Parquet, Arrow IPC (.arrow/.feather, .arrows for streams) or CSV file')
+    parser.add_argument('--output', required=True, help='Directory for part-*.parquet output files')
+    parser.add_argument('--models-dir', default='./ml_models')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=512, help='Reviews per model call')
+    parser.add_argument('--text-column', default='reviewText')
+    args = parser.parse_args()
+
+    bulk_score(args.input, args.output, models_dir=args.models_dir, workers=args.workers,
+               batch_size=args.batch_size, text_column=args.text_column)
+
+
+if __name__ == "__main__":
+    main()
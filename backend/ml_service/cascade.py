@@ -0,0 +1,193 @@
+"""
+Two-stage cascade in front of the LSTM heads.
+
+Stage 1 is a logistic regression per head over hashed word n-grams plus the
+cheap analyze_text_patterns() features. It is trained alongside the LSTMs
+(extract_models.py writes ml_models/cascade.pkl) and scores every review.
+A review only escalates to the LSTM heads when at least one stage-1
+probability falls inside that head's uncertainty band; otherwise the stage-1
+probabilities are used as the model confidences and the rule enhancements
+run as usual.
+
+A small random sample of confidently-classified reviews is still sent to the
+LSTMs (the audit rate) to measure how often the two stages agree.
+
+Environment:
+    CASCADE_ENABLED      1 to enable (default off)
+    CASCADE_BAND         "low,high" uncertainty band for every head (default 0.1,0.9)
+    CASCADE_BANDS        JSON object of per-head bands, e.g. {"fake_review": [0.2, 0.8]}
+    CASCADE_AUDIT_RATE   fraction of confident reviews also scored by the LSTMs
+"""
+
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+
+CASCADE_FILE = 'cascade.pkl'
+
+# Decision thresholds on the raw head outputs, used to measure agreement
+DECISION_THRESHOLDS = {
+    'fake_review': 0.45,
+    'burst_review': 0.35,
+    'copy_paste_review': 0.35,
+    'likely_bot': 0.35
+}
+
+PATTERN_FEATURES = ['repetition_score', 'suspicious_phrase_count', 'exclamation_count',
+                    'generic_word_count', 'repeated_starters', 'total_words', 'unique_words']
+
+
+def make_vectorizer():
+    return HashingVectorizer(ngram_range=(1, 2), n_features=2 ** 18, alternate_sign=False, norm='l2')
+
+
+def build_stage1_features(vectorizer, texts, text_analyses):
+    hashed = vectorizer.transform(texts)
+    patterns = np.array(
+        [[analysis.get(name, 0) for name in PATTERN_FEATURES] for analysis in text_analyses],
+        dtype=np.float64
+    )
+    # Counts grow without bound; log1p keeps them on the scale of the hashed features
+    patterns = np.log1p(np.maximum(patterns, 0))
+    return sparse.hstack([hashed, sparse.csr_matrix(patterns)], format='csr')
+
+
+def train_cascade(texts, text_analyses, labels_by_head, models_dir):
+    """Fit one linear model per head and save them to ml_models/cascade.pkl"""
+    vectorizer = make_vectorizer()
+    X = build_stage1_features(vectorizer, texts, text_analyses)
+
+    heads = {}
+    for head, labels in labels_by_head.items():
+        labels = np.asarray(labels, dtype=np.int64)
+        if len(np.unique(labels)) < 2:
+            # A single class can't be fit; fall back to the constant prior
+            heads[head] = float(labels.mean()) if len(labels) else 0.5
+            continue
+        model = LogisticRegression(max_iter=1000, C=1.0)
+        model.fit(X, labels)
+        heads[head] = model
+
+    with open(os.path.join(models_dir, CASCADE_FILE), 'wb') as f:
+        pickle.dump({'heads': heads}, f)
+    print(f"Saved {CASCADE_FILE}")
+
+
+def _bands_from_env(heads):
+    low, high = (float(value) for value in os.environ.get('CASCADE_BAND', '0.1,0.9').split(','))
+    bands = {head: (low, high) for head in heads}
+    overrides = json.loads(os.environ.get('CASCADE_BANDS', '{}'))
+    for head, band in overrides.items():
+        bands[head] = (float(band[0]), float(band[1]))
+    return bands
+
+
+class CascadeStats:
+    """Escalation and agreement counters, safe to update from many threads"""
+
+    def __init__(self, heads):
+        self._lock = threading.Lock()
+        self.heads = list(heads)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.scored = 0
+            self.escalated = 0
+            self.audited = 0
+            self.agreements = {head: 0 for head in self.heads}
+
+    def record(self, scored, escalated, audited, agreements):
+        with self._lock:
+            self.scored += scored
+            self.escalated += escalated
+            self.audited += audited
+            for head, count in agreements.items():
+                self.agreements[head] += count
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'reviews_scored': self.scored,
+                'escalated': self.escalated,
+                'escalation_rate': self.escalated / self.scored if self.scored else 0.0,
+                'audited': self.audited,
+                'agreement': {
+                    head: count / self.audited if self.audited else None
+                    for head, count in self.agreements.items()
+                }
+            }
+
+
+class Cascade:
+    """Stage-1 linear models plus the escalation policy"""
+
+    def __init__(self, heads, bands=None, audit_rate=None):
+        self.vectorizer = make_vectorizer()
+        self.heads = heads
+        self.bands = bands or _bands_from_env(heads)
+        if audit_rate is None:
+            audit_rate = float(os.environ.get('CASCADE_AUDIT_RATE', 0.01))
+        self.audit_rate = audit_rate
+        self.stats = CascadeStats(heads)
+        self._rng = np.random.default_rng()
+
+    @classmethod
+    def load(cls, models_dir):
+        """Load cascade.pkl if the cascade is enabled and the file exists"""
+        if os.environ.get('CASCADE_ENABLED', '0') != '1':
+            return None
+        path = os.path.join(models_dir, CASCADE_FILE)
+        if not os.path.exists(path):
+            print(f"Cascade enabled but {path} is missing; scoring every review with the LSTMs")
+            return None
+        with open(path, 'rb') as f:
+            return cls(pickle.load(f)['heads'])
+
+    def predict(self, texts, text_analyses):
+        """Stage-1 probabilities for every head"""
+        X = build_stage1_features(self.vectorizer, texts, text_analyses)
+        probabilities = {}
+        for head, model in self.heads.items():
+            if isinstance(model, float):
+                probabilities[head] = np.full(X.shape[0], model)
+            else:
+                probabilities[head] = model.predict_proba(X)[:, 1]
+        return probabilities
+
+    def needs_escalation(self, probabilities):
+        """True for reviews where any head is inside its uncertainty band"""
+        size = len(next(iter(probabilities.values())))
+        escalate = np.zeros(size, dtype=bool)
+        for head, values in probabilities.items():
+            low, high = self.bands[head]
+            escalate |= (values > low) & (values < high)
+        return escalate
+
+    def sample_audit(self, confident):
+        """Pick a random subset of confident reviews to also score with the LSTMs"""
+        if self.audit_rate <= 0:
+            return np.zeros_like(confident)
+        return confident & (self._rng.random(len(confident)) < self.audit_rate)
+
+    def record(self, escalate, audit, stage1, lstm_scores, lstm_rows):
+        """Update stats; lstm_scores are aligned with lstm_rows"""
+        audited_positions = np.flatnonzero(audit[lstm_rows])
+        # Only count audits where every LSTM head produced a score
+        scored = ~np.any([np.isnan(lstm_scores[head][audited_positions]) for head in self.heads], axis=0)
+        audited_positions = audited_positions[scored]
+        audited_rows = lstm_rows[audited_positions]
+
+        agreements = {}
+        for head in self.heads:
+            threshold = DECISION_THRESHOLDS.get(head, 0.5)
+            stage1_decision = stage1[head][audited_rows] > threshold
+            lstm_decision = lstm_scores[head][audited_positions] > threshold
+            agreements[head] = int(np.sum(stage1_decision == lstm_decision))
+        self.stats.record(len(escalate), int(escalate.sum()), len(audited_rows), agreements)
@@ -0,0 +1,259 @@
+"""
+Collusion detection over the reviewer / IP / product / seller graph.
+
+Every review that passes through the detector adds edges to an incremental
+graph: reviewer-IP, reviewer-product and reviewer-seller. Nodes are interned
+with the same 64-bit HashIndex used by the reviewer index and edges are kept
+in growable NumPy buffers, so ingestion is cheap and memory stays compact.
+
+Analysis runs in batch over the whole graph with sparse matrices:
+
+1. Connected components of the reviewer-IP graph group reviewers that share
+   addresses. IPs with more than COLLUSION_MAX_IP_REVIEWERS distinct
+   reviewers (carrier NAT, offices, public Wi-Fi) are left out, since they
+   would chain unrelated shoppers together.
+2. Each component is scored by how densely its reviewers co-review the same
+   products (the share of its reviewer-product edges that land on a product
+   reviewed by at least two members), measured against the share expected
+   by chance for a component of that size given each product's popularity.
+   The score is the excess over chance, scaled to [0, 1]. Review rings are
+   small, tightly connected and hit the same listings; unrelated shoppers
+   behind a shared NAT rarely do.
+3. Only components of COLLUSION_MIN_RING_SIZE to COLLUSION_MAX_RING_SIZE
+   reviewers scoring at least COLLUSION_MIN_SCORE count as rings; a giant
+   component built from incidental IP sharing is not a ring, whatever its
+   density.
+4. A seller's collusion ratio is the ring score averaged over its distinct
+   reviewers.
+
+Everything after interning is vectorized, so millions of edges are analyzed
+in seconds. calculate_seller_risk_score uses the seller's ratio as a risk
+factor.
+
+Environment:
+    COLLUSION_MIN_RING_SIZE      reviewers needed before a component counts (default 3)
+    COLLUSION_MAX_RING_SIZE      larger components are never rings (default 50)
+    COLLUSION_MAX_IP_REVIEWERS   IPs shared by more reviewers are ignored (default 20)
+    COLLUSION_MIN_SCORE          excess co-review density that makes a ring (default 0.5)
+    COLLUSION_REFRESH_SECONDS    minimum time between re-analyses (default 5)
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from reviewer_index import HashIndex, hash_key
+
+class EdgeBuffer:
+    """Growable pair of int32 arrays"""
+
+    def __init__(self, capacity=1024):
+        self.src = np.zeros(capacity, dtype=np.int32)
+        self.dst = np.zeros(capacity, dtype=np.int32)
+        self.size = 0
+
+    def append(self, src, dst):
+        if self.size == len(self.src):
+            self.src = np.concatenate([self.src, np.zeros_like(self.src)])
+            self.dst = np.concatenate([self.dst, np.zeros_like(self.dst)])
+        self.src[self.size] = src
+        self.dst[self.size] = dst
+        self.size += 1
+
+    def unique(self):
+        """Deduplicate in place and return the (src, dst) views"""
+        if self.size:
+            packed = (self.src[:self.size].astype(np.int64) << 32) | self.dst[:self.size].astype(np.int64)
+            packed = np.unique(packed)
+            self.size = len(packed)
+            self.src[:self.size] = packed >> 32
+            self.dst[:self.size] = packed & 0xFFFFFFFF
+        return self.src[:self.size], self.dst[:self.size]
+
+
+class CollusionGraph:
+    """Incremental multi-partite review graph with batch ring scoring"""
+
+    def __init__(self, min_ring_size=None, max_ring_size=None, max_ip_reviewers=None, min_score=None,
+                 refresh_seconds=None):
+        self.min_ring_size = min_ring_size or int(os.environ.get('COLLUSION_MIN_RING_SIZE', 3))
+        self.max_ring_size = max_ring_size or int(os.environ.get('COLLUSION_MAX_RING_SIZE', 50))
+        self.max_ip_reviewers = max_ip_reviewers or int(os.environ.get('COLLUSION_MAX_IP_REVIEWERS', 20))
+        self.min_score = min_score if min_score is not None else float(os.environ.get('COLLUSION_MIN_SCORE', 0.5))
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else float(
+            os.environ.get('COLLUSION_REFRESH_SECONDS', 5)
+        )
+        self.nodes = HashIndex()
+        self.node_count = 0
+        self.edges = {name: EdgeBuffer() for name in ('ip', 'product', 'seller')}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._analyzed_at = 0.0
+        self._analysis = None
+
+    def _node(self, node_type, key):
+        key_hash = hash_key(f"{node_type}:{key}")
+        node = self.nodes.get(key_hash)
+        if node < 0:
+            node = self.node_count
+            self.nodes.insert(key_hash, node)
+            self.node_count += 1
+        return node
+
+    def _lookup(self, node_type, key):
+        return self.nodes.get(hash_key(f"{node_type}:{key}"))
+
+    def add_reviews(self, reviews, seller_id=None):
+        """Add edges for reviews that carry a reviewerId"""
+        with self._lock:
+            for review in reviews:
+                reviewer_id = review.get('reviewerId')
+                if not reviewer_id:
+                    continue
+                reviewer = self._node('reviewer', reviewer_id)
+                ip_address = review.get('ipAddress')
+                if ip_address and ip_address != 'unknown':
+                    self.edges['ip'].append(reviewer, self._node('ip', ip_address))
+                if review.get('productId'):
+                    self.edges['product'].append(reviewer, self._node('product', review['productId']))
+                review_seller = review.get('sellerId') or seller_id
+                if review_seller:
+                    self.edges['seller'].append(reviewer, self._node('seller', review_seller))
+                self._dirty = True
+
+    def link_seller(self, reviews, seller_id):
+        """Add reviewer-seller edges for already added reviews that lack a sellerId"""
+        if not seller_id:
+            return
+        with self._lock:
+            for review in reviews:
+                reviewer_id = review.get('reviewerId')
+                if reviewer_id and not review.get('sellerId'):
+                    self.edges['seller'].append(self._node('reviewer', reviewer_id), self._node('seller', seller_id))
+                    self._dirty = True
+
+    def analyze(self):
+        """Score every component; returns per-node component ids and scores"""
+        with self._lock:
+            n = self.node_count
+            ip_src, ip_dst = (array.copy() for array in self.edges['ip'].unique())
+            product_src, product_dst = (array.copy() for array in self.edges['product'].unique())
+            seller_src, seller_dst = (array.copy() for array in self.edges['seller'].unique())
+            self._dirty = False
+
+        if n == 0:
+            analysis = {
+                'labels': np.zeros(0, dtype=np.int32),
+                'component_size': np.zeros(0, dtype=np.int64),
+                'component_score': np.zeros(0),
+                'seller_ratio': np.zeros(0),
+                'seller_src': seller_src,
+                'seller_dst': seller_dst,
+                'edges': 0
+            }
+            with self._lock:
+                self._analysis = analysis
+                self._analyzed_at = time.monotonic()
+            return analysis
+
+        # 1. Components of the reviewer-IP graph, without high fan-out IPs
+        shared = np.bincount(ip_dst, minlength=n)[ip_dst] <= self.max_ip_reviewers
+        adjacency = sparse.coo_matrix(
+            (np.ones(int(shared.sum()), dtype=np.int8), (ip_src[shared], ip_dst[shared])), shape=(n, n)
+        ).tocsr()
+        _, labels = connected_components(adjacency, directed=False)
+
+        reviewer_nodes = np.unique(np.concatenate([ip_src, product_src, seller_src]))
+        component_size = np.bincount(labels[reviewer_nodes], minlength=labels.max() + 1)
+
+        # 2. Co-review density: share of a component's product edges on products
+        #    that at least two of its reviewers reviewed, against chance
+        component_score = np.zeros(len(component_size))
+        if len(product_src):
+            component = labels[product_src].astype(np.int64)
+            pair = component * max(n, 1) + product_dst
+            _, inverse, counts = np.unique(pair, return_inverse=True, return_counts=True)
+            co_reviewed = counts[inverse] >= 2
+            edges_per_component = np.bincount(component, minlength=len(component_size))
+            co_per_component = np.bincount(component, weights=co_reviewed, minlength=len(component_size))
+
+            # Chance that one of the other k - 1 members also reviewed the
+            # product, if members picked products like everyone else does
+            popularity = (np.bincount(product_dst, minlength=n)[product_dst] - 1) / max(len(reviewer_nodes) - 1, 1)
+            expected_edge = 1 - (1 - popularity) ** (component_size[component] - 1)
+            expected_per_component = np.bincount(component, weights=expected_edge, minlength=len(component_size))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                density = np.where(edges_per_component > 0, co_per_component / edges_per_component, 0.0)
+                expected = np.where(edges_per_component > 0, expected_per_component / edges_per_component, 0.0)
+                excess = np.where(expected < 1, (density - expected) / (1 - expected), 0.0)
+            excess = np.clip(excess, 0.0, 1.0)
+
+            # 3. Only small, tight components are rings
+            ring = (
+                (component_size >= self.min_ring_size) &
+                (component_size <= self.max_ring_size) &
+                (excess >= self.min_score)
+            )
+            component_score = np.where(ring, excess, 0.0)
+
+        # 4. Seller collusion ratio over distinct reviewers
+        seller_reviewers = np.bincount(seller_dst, minlength=n).astype(np.float64)
+        seller_weight = np.bincount(seller_dst, weights=component_score[labels[seller_src]], minlength=n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            seller_ratio = np.where(seller_reviewers > 0, seller_weight / seller_reviewers, 0.0)
+
+        analysis = {
+            'labels': labels,
+            'component_size': component_size,
+            'component_score': component_score,
+            'seller_ratio': seller_ratio,
+            'seller_src': seller_src,
+            'seller_dst': seller_dst,
+            'edges': len(ip_src) + len(product_src) + len(seller_src)
+        }
+        with self._lock:
+            self._analysis = analysis
+            self._analyzed_at = time.monotonic()
+        return analysis
+
+    def current_analysis(self):
+        """Cached analysis, refreshed when the graph changed and it is old enough"""
+        stale = self._analysis is None or (
+            self._dirty and time.monotonic() - self._analyzed_at >= self.refresh_seconds
+        )
+        return self.analyze() if stale else self._analysis
+
+    def seller_collusion(self, seller_id):
+        """Collusion summary for one seller"""
+        empty = {'ratio': 0.0, 'rings': 0, 'largest_ring': 0, 'reviewers_in_rings': 0}
+        if not seller_id:
+            return empty
+
+        analysis = self.current_analysis()
+        # HashIndex may be resized by a concurrent add_reviews
+        with self._lock:
+            seller = self._lookup('seller', seller_id)
+        if seller < 0 or seller >= len(analysis['seller_ratio']):
+            return empty
+
+        reviewers = analysis['seller_src'][analysis['seller_dst'] == seller]
+        components = analysis['labels'][reviewers]
+        in_ring = analysis['component_score'][components] > 0
+        rings = np.unique(components[in_ring])
+        return {
+            'ratio': float(analysis['seller_ratio'][seller]),
+            'rings': int(len(rings)),
+            'largest_ring': int(analysis['component_size'][rings].max()) if len(rings) else 0,
+            'reviewers_in_rings': int(in_ring.sum())
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'nodes': self.node_count,
+                'edges': {name: buffer.size for name, buffer in self.edges.items()}
+            }
@@ -0,0 +1,102 @@
+"""
+Adaptive load shedding for interactive scoring.
+
+Under overload a cheaper real prediction beats a timeout (which the Node
+backend turns into mock predictions). The scheduler reports how long every
+interactive micro-batch waited in the queue; DegradationController smooths
+that into an EWMA and steps through three levels:
+
+    full         all four LSTM heads (plus the cascade, if enabled)
+    fake_only    only the fake_review head; the pattern heads come from the
+                 cascade's stage-1 models when available, otherwise from the
+                 rule enhancements alone
+    rules_only   no LSTM at all; stage-1 scores when available, otherwise the
+                 fake score is derived from the rule-enhanced patterns
+
+A level is entered when the smoothed wait crosses its threshold and left
+only once it falls below DEGRADE_RECOVERY_RATIO of that threshold and the
+level has been held for DEGRADE_MIN_DWELL_SECONDS, so the service does not
+flap between modes. Every prediction is tagged with degradationLevel and the
+time spent in each level is reported under /metrics/scheduler.
+
+Environment:
+    DEGRADATION_ENABLED           0 to always score at full (default 1)
+    DEGRADE_FAKE_ONLY_MS          smoothed queue wait that enters fake_only (default 500)
+    DEGRADE_RULES_ONLY_MS         smoothed queue wait that enters rules_only (default 2000)
+    DEGRADE_RECOVERY_RATIO        leave a level below this share of its threshold (default 0.5)
+    DEGRADE_MIN_DWELL_SECONDS     minimum time in a level before stepping down (default 5)
+"""
+
+import os
+import threading
+import time
+
+LEVELS = ['full', 'fake_only', 'rules_only']
+
+# Weight of the newest observation in the queue wait EWMA
+WAIT_ALPHA = 0.3
+
+
+class DegradationController:
+    """Queue-latency driven degradation level with hysteresis"""
+
+    def __init__(self, enabled=None, thresholds_ms=None, recovery_ratio=None, min_dwell_seconds=None):
+        if enabled is None:
+            enabled = os.environ.get('DEGRADATION_ENABLED', '1') != '0'
+        self.enabled = enabled
+        # thresholds_ms[i] enters LEVELS[i + 1]
+        self.thresholds_ms = thresholds_ms or [
+            float(os.environ.get('DEGRADE_FAKE_ONLY_MS', 500)),
+            float(os.environ.get('DEGRADE_RULES_ONLY_MS', 2000))
+        ]
+        self.recovery_ratio = recovery_ratio or float(os.environ.get('DEGRADE_RECOVERY_RATIO', 0.5))
+        self.min_dwell_seconds = min_dwell_seconds if min_dwell_seconds is not None else float(
+            os.environ.get('DEGRADE_MIN_DWELL_SECONDS', 5)
+        )
+        self._lock = threading.Lock()
+        self.level = 0
+        self.wait_ewma_ms = 0.0
+        self.transitions = 0
+        self._entered_at = time.monotonic()
+        self._time_in_level = [0.0] * len(LEVELS)
+
+    @property
+    def current(self):
+        return LEVELS[self.level]
+
+    def observe(self, queue_wait_ms):
+        """Feed one queue wait sample and return the level to score at"""
+        if not self.enabled:
+            return LEVELS[0]
+        with self._lock:
+            self.wait_ewma_ms = WAIT_ALPHA * queue_wait_ms + (1 - WAIT_ALPHA) * self.wait_ewma_ms
+            now = time.monotonic()
+
+            level = self.level
+            # Step up as far as the wait requires
+            while level < len(self.thresholds_ms) and self.wait_ewma_ms > self.thresholds_ms[level]:
+                level += 1
+            # Step down one level at a time, after the dwell time
+            if level == self.level and level > 0 and now - self._entered_at >= self.min_dwell_seconds:
+                if self.wait_ewma_ms < self.thresholds_ms[level - 1] * self.recovery_ratio:
+                    level -= 1
+
+            if level != self.level:
+                self._time_in_level[self.level] += now - self._entered_at
+                self._entered_at = now
+                self.level = level
+                self.transitions += 1
+                print(f"Degradation level changed to {LEVELS[level]} (queue wait {self.wait_ewma_ms:.0f}ms)")
+            return LEVELS[self.level]
+
+    def snapshot(self):
+        with self._lock:
+            time_in_level = list(self._time_in_level)
+            time_in_level[self.level] += time.monotonic() - self._entered_at
+            return {
+                'enabled': self.enabled,
+                'level': LEVELS[self.level],
+                'queue_wait_ewma_ms': self.wait_ewma_ms,
+                'transitions': self.transitions,
+                'seconds_in_level': dict(zip(LEVELS, time_in_level))
+            }
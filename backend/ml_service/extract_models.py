@@ -14,6 +14,9 @@ from sklearn.preprocessing import MinMaxScaler
 from sklearn.model_selection import train_test_split
 import pickle
 import os
+from cascade import train_cascade
+from fake_review_detector import analyze_text_patterns
+from text_normalization import token_texts
 
 def extract_models_from_notebook():
     """Extract models and preprocessing components from notebook training"""
@@ -61,14 +64,15 @@ def extract_models_from_notebook():
     scaler = MinMaxScaler()
     data[["time_diff", "ip_count"]] = scaler.fit_transform(data[["time_diff", "ip_count"]])
     
-    # Text preprocessing
+    # Text preprocessing, normalized the same way as at inference
+    normalized_texts = token_texts(data["review_text"])
     length = 0
-    for val in data["review_text"]:
+    for val in normalized_texts:
         length = max(length, len(val.split()))
     
     tokenizer = Tokenizer()
-    tokenizer.fit_on_texts(data["review_text"])
-    X_text = pad_sequences(tokenizer.texts_to_sequences(data["review_text"]), maxlen=length)
+    tokenizer.fit_on_texts(normalized_texts)
+    X_text = pad_sequences(tokenizer.texts_to_sequences(normalized_texts), maxlen=length)
     
     X_extra = np.array(data[["time_diff", "ip_count"]])
     
@@ -166,6 +170,16 @@ def extract_models_from_notebook():
     model_lb.save(os.path.join(models_dir, 'likely_bot.h5'))
     print("Saved likely_bot.h5")
     
+    # Train the stage-1 cascade models on the same labels
+    print("Training cascade stage-1 models...")
+    review_texts = list(data["review_text"])
+    train_cascade(review_texts, [analyze_text_patterns(text) for text in review_texts], {
+        'fake_review': y,
+        'burst_review': y_br,
+        'copy_paste_review': y_cpr,
+        'likely_bot': y_lb
+    }, models_dir)
+    
     # Save preprocessing components
     print("Saving preprocessing components...")
     
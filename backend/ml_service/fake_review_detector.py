@@ -9,14 +9,109 @@ from datetime import datetime
 import json
 import os
 import pickle
+import threading
+from types import MappingProxyType
+from cascade import Cascade
+from collusion_graph import CollusionGraph
+from inference import InferenceSession
+from reviewer_index import ReviewerIndex
+from semantic_index import SemanticIndex
+import tracing
+from rules import RuleEngine, build_features
+from text_normalization import normalize
+from vocabulary import OOVTracker, find_oov_words
+
+# Model heads scored for every review
+MODEL_HEADS = ['fake_review', 'burst_review', 'copy_paste_review', 'likely_bot']
+
+def analyze_text_patterns(review_text):
+    """Analyze text for suspicious patterns that indicate bot or copy-paste activity"""
+    try:
+        normalized = normalize(review_text)
+        text_lower = normalized.token_text
+        words = normalized.words
+        
+        # Calculate repetition score
+        total_words = len(words)
+        unique_words = len(set(words))
+        repetition_score = 1 - (unique_words / total_words) if total_words > 0 else 0
+        
+        # Check for suspicious phrases commonly used by bots
+        suspicious_phrases = [
+            'great product', 'fast shipping', 'excellent quality', 'highly recommend',
+            'would buy again', 'perfect transaction', 'amazing service', 'best purchase',
+            'love it', 'excellent product', 'great service', 'fast delivery',
+            'good quality', 'satisfied with', 'recommend to friends', 'thank you seller'
+        ]
+        
+        suspicious_phrase_count = sum(1 for phrase in suspicious_phrases if phrase in text_lower)
+        
+        # Count exclamation marks (bots often overuse them); NFKC folds '！' into '!'
+        exclamation_count = normalized.text.count('!')
+        
+        # Count generic words that bots often use
+        generic_words = ['good', 'great', 'excellent', 'amazing', 'perfect', 'best', 'love', 'recommend']
+        generic_word_count = sum(1 for word in generic_words if word in text_lower)
+        
+        # Check for repetitive sentence structures
+        sentence_start_words = normalized.sentence_starts
+        
+        # Count repeated sentence starters
+        repeated_starters = len(sentence_start_words) - len(set(sentence_start_words))
+        
+        return {
+            'repetition_score': repetition_score,
+            'suspicious_phrase_count': suspicious_phrase_count,
+            'exclamation_count': exclamation_count,
+            'generic_word_count': generic_word_count,
+            'repeated_starters': repeated_starters,
+            'total_words': total_words,
+            'unique_words': unique_words
+        }
+        
+    except Exception as e:
+        print(f"Error analyzing text patterns: {e}")
+        return {
+            'repetition_score': 0,
+            'suspicious_phrase_count': 0,
+            'exclamation_count': 0,
+            'generic_word_count': 0,
+            'repeated_starters': 0,
+            'total_words': 0,
+            'unique_words': 0
+        }
 
 class FakeReviewDetector:
-    def __init__(self, models_dir='./ml_models'):
+    """Fake review detector shared by all request threads.
+
+    Artifacts are loaded once and never mutated afterwards; inference goes
+    through an InferenceSession, which is safe to call concurrently (see
+    inference.py for the concurrency model).
+    """
+
+    def __init__(self, models_dir='./ml_models', track_reviewers=True):
         self.models_dir = models_dir
         self.tokenizer = None
         self.scaler = None
         self.max_length = 0
-        self.models = {}
+        self.models = MappingProxyType({})
+        self.session = InferenceSession({})
+        self.oov_tracker = OOVTracker()
+        self.rules = RuleEngine()
+        self.cascade = None
+        
+        # Per-reviewer aggregates for credibility; off for replays such as shadow scoring
+        self.reviewer_index_path = os.environ.get(
+            'REVIEWER_INDEX_PATH', os.path.join(models_dir, 'reviewer_index.npz')
+        )
+        self.reviewer_index = ReviewerIndex.load_or_create(self.reviewer_index_path) if track_reviewers else None
+        self.collusion_graph = CollusionGraph() if track_reviewers else None
+        
+        # Embedding index for paraphrased duplicates within a seller/product
+        self.semantic_index_path = os.environ.get(
+            'SEMANTIC_INDEX_PATH', os.path.join(models_dir, 'semantic_index.bin')
+        )
+        self.semantic_index = SemanticIndex.load_or_create(self.semantic_index_path) if track_reviewers else None
         
         # Load models and preprocessing components
         self.load_models()
@@ -37,10 +132,18 @@ class FakeReviewDetector:
                 self.max_length = int(f.read().strip())
             
             # Load models
-            self.models['fake_review'] = load_model(os.path.join(self.models_dir, 'fake_review.h5'))
-            self.models['burst_review'] = load_model(os.path.join(self.models_dir, 'burst_review.h5'))
-            self.models['copy_paste_review'] = load_model(os.path.join(self.models_dir, 'copy-paste_review.h5'))
-            self.models['likely_bot'] = load_model(os.path.join(self.models_dir, 'likely_bot.h5'))
+            models = {}
+            models['fake_review'] = load_model(os.path.join(self.models_dir, 'fake_review.h5'))
+            models['burst_review'] = load_model(os.path.join(self.models_dir, 'burst_review.h5'))
+            models['copy_paste_review'] = load_model(os.path.join(self.models_dir, 'copy-paste_review.h5'))
+            models['likely_bot'] = load_model(os.path.join(self.models_dir, 'likely_bot.h5'))
+            
+            # Read-only from here on; requests only go through the session
+            self.models = MappingProxyType(models)
+            self.session = InferenceSession(self.models)
+            
+            # Optional stage-1 cascade (CASCADE_ENABLED=1)
+            self.cascade = Cascade.load(self.models_dir)
             
             print("All models loaded successfully!")
             
@@ -69,13 +172,15 @@ class FakeReviewDetector:
             # Enhanced text analysis for bot/copy-paste detection
             text_features = self.analyze_text_patterns(review_text)
             
-            # Prepare text features
-            if not self.tokenizer.word_index:
-                # If tokenizer is empty, fit it on the current text
-                self.tokenizer.fit_on_texts([review_text])
+            # Prepare text features. The tokenizer is never refit on live
+            # traffic; unknown words are only counted for vocabulary.py
+            token_text = normalize(review_text).token_text
+            if self.tokenizer.word_index:
+                self.oov_tracker.observe(find_oov_words(self.tokenizer, token_text))
             
-            text_sequence = self.tokenizer.texts_to_sequences([review_text])
-            text_padded = pad_sequences(text_sequence, maxlen=self.max_length)
+            with tracing.span('tokenize'):
+                text_sequence = self.tokenizer.texts_to_sequences([token_text])
+                text_padded = pad_sequences(text_sequence, maxlen=self.max_length)
             
             # Prepare extra features with enhanced analysis
             extra_features = np.array([[
@@ -121,100 +226,44 @@ class FakeReviewDetector:
     
     def analyze_text_patterns(self, review_text):
         """Analyze text for suspicious patterns that indicate bot or copy-paste activity"""
-        try:
-            text_lower = review_text.lower()
-            words = text_lower.split()
-            
-            # Check for repetition patterns
-            word_counts = {}
-            for word in words:
-                word_counts[word] = word_counts.get(word, 0) + 1
-            
-            # Calculate repetition score
-            total_words = len(words)
-            unique_words = len(word_counts)
-            repetition_score = 1 - (unique_words / total_words) if total_words > 0 else 0
-            
-            # Check for suspicious phrases commonly used by bots
-            suspicious_phrases = [
-                'great product', 'fast shipping', 'excellent quality', 'highly recommend',
-                'would buy again', 'perfect transaction', 'amazing service', 'best purchase',
-                'love it', 'excellent product', 'great service', 'fast delivery',
-                'good quality', 'satisfied with', 'recommend to friends', 'thank you seller'
-            ]
-            
-            suspicious_phrase_count = sum(1 for phrase in suspicious_phrases if phrase in text_lower)
-            
-            # Count exclamation marks (bots often overuse them)
-            exclamation_count = text_lower.count('!')
-            
-            # Count generic words that bots often use
-            generic_words = ['good', 'great', 'excellent', 'amazing', 'perfect', 'best', 'love', 'recommend']
-            generic_word_count = sum(1 for word in generic_words if word in text_lower)
-            
-            # Check for repetitive sentence structures
-            sentences = review_text.split('.')
-            sentence_start_words = []
-            for sentence in sentences:
-                if sentence.strip():
-                    first_word = sentence.strip().split()[0].lower() if sentence.strip().split() else ''
-                    sentence_start_words.append(first_word)
-            
-            # Count repeated sentence starters
-            repeated_starters = len(sentence_start_words) - len(set(sentence_start_words))
-            
-            return {
-                'repetition_score': repetition_score,
-                'suspicious_phrase_count': suspicious_phrase_count,
-                'exclamation_count': exclamation_count,
-                'generic_word_count': generic_word_count,
-                'repeated_starters': repeated_starters,
-                'total_words': total_words,
-                'unique_words': unique_words
-            }
-            
-        except Exception as e:
-            print(f"Error analyzing text patterns: {e}")
-            return {
-                'repetition_score': 0,
-                'suspicious_phrase_count': 0,
-                'exclamation_count': 0,
-                'generic_word_count': 0,
-                'repeated_starters': 0,
-                'total_words': 0,
-                'unique_words': 0
-            }
+        return analyze_text_patterns(review_text)
     
-    def predict_fake_review(self, review_data):
+    def predict_fake_review(self, review_data, preprocessed=None):
         """Predict if a review is fake using the main model"""
         try:
-            preprocessed = self.preprocess_review(review_data)
+            if preprocessed is None:
+                preprocessed = self.preprocess_review(review_data)
             if not preprocessed:
                 return self.get_default_prediction()
             
-            prediction = self.models['fake_review'].predict([
+            prediction = self.session.predict(
+                'fake_review',
                 preprocessed['text_features'],
                 preprocessed['extra_features']
-            ])
+            )
             
-            confidence = float(prediction[0][0])
-            # Lower threshold from 0.5 to 0.45 to catch more AI-generated content
-            is_fake = confidence > 0.45
-            
-            return {
-                'isFake': bool(is_fake),
-                'confidence': confidence,
-                'riskScore': confidence * 100
-            }
+            return self.build_fake_prediction(float(prediction[0][0]))
             
         except Exception as e:
             print(f"Error predicting fake review: {e}")
             return self.get_default_prediction()
     
-    def predict_suspicious_patterns(self, review_data):
+    def build_fake_prediction(self, confidence):
+        """Turn the fake review model output into a prediction"""
+        # Lower threshold from 0.5 to 0.45 to catch more AI-generated content
+        is_fake = confidence > 0.45
+        
+        return {
+            'isFake': bool(is_fake),
+            'confidence': confidence,
+            'riskScore': confidence * 100
+        }
+    
+    def predict_suspicious_patterns(self, review_data, preprocessed=None):
         """Predict various suspicious patterns with confidence scores"""
         try:
-            preprocessed = self.preprocess_review(review_data)
+            if preprocessed is None:
+                preprocessed = self.preprocess_review(review_data)
             if not preprocessed:
                 return {
                     'burst_reviews': {'detected': False, 'confidence': 0.0},
@@ -222,55 +271,32 @@ class FakeReviewDetector:
                     'bot_activity': {'detected': False, 'confidence': 0.0}
                 }
             
-            patterns = {}
-            
             # Get ML model predictions
-            burst_pred = self.models['burst_review'].predict([
+            burst_pred = self.session.predict(
+                'burst_review',
                 preprocessed['text_features'],
                 preprocessed['extra_features']
-            ])
+            )
             burst_confidence = float(burst_pred[0][0])
             
-            copy_paste_pred = self.models['copy_paste_review'].predict([
+            copy_paste_pred = self.session.predict(
+                'copy_paste_review',
                 preprocessed['text_features'],
                 preprocessed['extra_features']
-            ])
+            )
             copy_paste_confidence = float(copy_paste_pred[0][0])
             
-            bot_pred = self.models['likely_bot'].predict([
+            bot_pred = self.session.predict(
+                'likely_bot',
                 preprocessed['text_features'],
                 preprocessed['extra_features']
-            ])
+            )
             bot_confidence = float(bot_pred[0][0])
             
-            # Apply rule-based enhancements
-            text_analysis = preprocessed.get('text_analysis', {})
-            
-            # Enhanced bot detection
-            bot_enhanced_confidence = self.enhance_bot_detection(bot_confidence, text_analysis, review_data)
-            
-            # Enhanced copy-paste detection
-            copy_paste_enhanced_confidence = self.enhance_copy_paste_detection(copy_paste_confidence, text_analysis, review_data)
-            
-            # Enhanced burst detection
-            burst_enhanced_confidence = self.enhance_burst_detection(burst_confidence, review_data)
-            
-            patterns['burst_reviews'] = {
-                'detected': burst_enhanced_confidence > 0.35,
-                'confidence': burst_enhanced_confidence
-            }
-            
-            patterns['copy_paste'] = {
-                'detected': copy_paste_enhanced_confidence > 0.35,
-                'confidence': copy_paste_enhanced_confidence
-            }
-            
-            patterns['bot_activity'] = {
-                'detected': bot_enhanced_confidence > 0.35,
-                'confidence': bot_enhanced_confidence
-            }
-            
-            return patterns
+            return self.build_pattern_predictions(
+                burst_confidence, copy_paste_confidence, bot_confidence,
+                preprocessed.get('text_analysis', {}), review_data
+            )
             
         except Exception as e:
             print(f"Error predicting suspicious patterns: {e}")
@@ -280,57 +306,53 @@ class FakeReviewDetector:
                 'bot_activity': {'detected': False, 'confidence': 0.0}
             }
     
-    def enhance_bot_detection(self, ml_confidence, text_analysis, review_data):
-        """Enhance bot detection with rule-based analysis"""
-        enhanced_confidence = ml_confidence
-        
-        # Boost confidence for suspicious patterns
-        if text_analysis.get('suspicious_phrase_count', 0) >= 3:
-            enhanced_confidence += 0.2
-        
-        if text_analysis.get('exclamation_count', 0) >= 3:
-            enhanced_confidence += 0.15
-        
-        if text_analysis.get('generic_word_count', 0) >= 4:
-            enhanced_confidence += 0.1
-        
-        if text_analysis.get('repetition_score', 0) > 0.3:
-            enhanced_confidence += 0.15
+    def build_pattern_predictions(self, burst_confidence, copy_paste_confidence, bot_confidence,
+                                  text_analysis, review_data):
+        """Apply rule-based enhancements to the pattern model outputs"""
+        return self.build_pattern_predictions_batch(
+            [burst_confidence], [copy_paste_confidence], [bot_confidence],
+            [text_analysis], [review_data]
+        )[0]
+    
+    def build_pattern_predictions_batch(self, burst_confidences, copy_paste_confidences, bot_confidences,
+                                        text_analyses, reviews, features=None):
+        """Apply the rule table (enhancement_rules.json) to a batch of pattern model outputs"""
+        if features is None:
+            features = build_features(reviews, text_analyses)
         
-        # Check for rating-text mismatch (5-star with generic text)
-        rating = review_data.get('rating', 5)
-        if rating == 5 and text_analysis.get('total_words', 0) < 10:
-            enhanced_confidence += 0.1
+        enhanced = {
+            'burst_reviews': self.rules.evaluate('burst_reviews', features, burst_confidences),
+            'copy_paste': self.rules.evaluate('copy_paste', features, copy_paste_confidences),
+            'bot_activity': self.rules.evaluate('bot_activity', features, bot_confidences)
+        }
+        thresholds = {name: self.rules.threshold(name, 0.35) for name in enhanced}
         
-        return min(enhanced_confidence, 1.0)
+        return [
+            {
+                name: {
+                    'detected': bool(confidences[i] > thresholds[name]),
+                    'confidence': float(confidences[i])
+                }
+                for name, confidences in enhanced.items()
+            }
+            for i in range(len(reviews))
+        ]
+    
+    def enhance_bot_detection(self, ml_confidence, text_analysis, review_data):
+        """Enhance bot detection with rule-based analysis"""
+        features = build_features([review_data], [text_analysis])
+        return float(self.rules.evaluate('bot_activity', features, [ml_confidence])[0])
     
     def enhance_copy_paste_detection(self, ml_confidence, text_analysis, review_data):
         """Enhance copy-paste detection with rule-based analysis"""
-        enhanced_confidence = ml_confidence
-        
-        # Boost confidence for copy-paste indicators
-        if text_analysis.get('repetition_score', 0) > 0.4:
-            enhanced_confidence += 0.25
-        
-        if text_analysis.get('suspicious_phrase_count', 0) >= 4:
-            enhanced_confidence += 0.2
-        
-        if text_analysis.get('repeated_starters', 0) >= 2:
-            enhanced_confidence += 0.15
-        
-        # Check for very generic text
-        if text_analysis.get('generic_word_count', 0) >= 5:
-            enhanced_confidence += 0.1
-        
-        return min(enhanced_confidence, 1.0)
+        features = build_features([review_data], [text_analysis])
+        return float(self.rules.evaluate('copy_paste', features, [ml_confidence])[0])
     
     def enhance_burst_detection(self, ml_confidence, review_data):
         """Enhance burst detection with rule-based analysis"""
-        enhanced_confidence = ml_confidence
-        
-        # This would be enhanced with actual time-series data
-        # For now, we'll use the ML model confidence
-        return enhanced_confidence
+        # No burst rules ship by default; time-series rules can be added to the table
+        features = build_features([review_data], [{}])
+        return float(self.rules.evaluate('burst_reviews', features, [ml_confidence])[0])
     
     def analyze_sentiment(self, review_text):
         """Simple sentiment analysis based on rating and text"""
@@ -340,7 +362,7 @@ class FakeReviewDetector:
             positive_words = ['good', 'great', 'excellent', 'amazing', 'love', 'perfect', 'best', 'wonderful']
             negative_words = ['bad', 'terrible', 'awful', 'hate', 'worst', 'disappointing', 'poor']
             
-            text_lower = review_text.lower()
+            text_lower = normalize(review_text).token_text
             positive_count = sum(1 for word in positive_words if word in text_lower)
             negative_count = sum(1 for word in negative_words if word in text_lower)
             
@@ -369,34 +391,25 @@ class FakeReviewDetector:
     def calculate_review_authenticity(self, review_data, predictions):
         """Calculate overall review authenticity score"""
         try:
-            base_score = 100
-            
-            # Reduce score based on fake review probability
-            if predictions.get('isFake', False):
-                base_score -= predictions.get('confidence', 0.5) * 50
-            
-            # Reduce score based on suspicious patterns
-            patterns = predictions.get('suspiciousPatterns', [])
-            base_score -= len(patterns) * 15
-            
-            # Reduce score for very short or very long reviews
-            review_length = len(review_data.get('reviewText', '').split())
-            if review_length < 5:
-                base_score -= 20
-            elif review_length > 500:
-                base_score -= 10
-            
-            # Reduce score for extreme ratings (1 or 5) with short text
-            rating = review_data.get('rating', 5)
-            if (rating == 1 or rating == 5) and review_length < 10:
-                base_score -= 15
-            
-            return max(0, min(100, base_score))
+            return float(self.calculate_review_authenticity_batch([review_data], [predictions])[0])
             
         except Exception as e:
             print(f"Error calculating authenticity: {e}")
             return 50
     
+    def calculate_review_authenticity_batch(self, reviews, predictions, features=None):
+        """Authenticity scores for a batch, from the 'authenticity' rules"""
+        if features is None:
+            features = build_features(reviews, [{}] * len(reviews))
+        
+        features = dict(features)
+        features['is_fake'] = np.array([bool(p.get('isFake', False)) for p in predictions], dtype=np.float64)
+        features['fake_confidence'] = np.array([p.get('confidence', 0.5) for p in predictions], dtype=np.float64)
+        features['pattern_count'] = np.array(
+            [len(p.get('suspiciousPatterns', [])) for p in predictions], dtype=np.float64
+        )
+        return self.rules.evaluate('authenticity', features)
+    
     def calculate_reviewer_credibility(self, reviewer_data):
         """Calculate reviewer credibility score"""
         try:
@@ -414,6 +427,11 @@ class FakeReviewDetector:
             fake_reviews = reviewer_data.get('fakeReviewsDetected', 0)
             base_score -= fake_reviews * 20
             
+            # Decrease score for posting faster than a typical shopper
+            reviews_per_day = reviewer_data.get('reviewsPerDay', 0)
+            if reviews_per_day > 3:
+                base_score -= min((reviews_per_day - 3) * 5, 20)
+            
             return max(0, min(100, base_score))
             
         except Exception as e:
@@ -433,6 +451,7 @@ class FakeReviewDetector:
             },
             'reviewAuthenticity': 50,
             'reviewerCredibility': 50,
+            'semanticDuplicates': [],
             'burstReviewDetected': False,
             'burstReviewConfidence': 0.0,
             'copyPasteDetected': False,
@@ -444,57 +463,242 @@ class FakeReviewDetector:
     def process_review(self, review_data):
         """Main method to process a review and return all predictions"""
         try:
-            # Get fake review prediction
-            fake_prediction = self.predict_fake_review(review_data)
-            
-            # Get suspicious patterns with detailed confidence scores
-            suspicious_patterns = self.predict_suspicious_patterns(review_data)
+            return self.process_reviews([review_data])[0]
             
-            # Analyze sentiment
+        except Exception as e:
+            print(f"Error processing review: {e}")
+            return self.get_default_prediction()
+    
+    def process_reviews(self, reviews, level='full'):
+        """Score a list of reviews.
+        
+        Each model runs once per batch instead of once per review, and the
+        rule-based enhancements run once over the batch as array operations.
+        level is a degradation level (see degradation.py); every result is
+        tagged with it.
+        """
+        with tracing.span('preprocess', reviews=len(reviews)):
+            preprocessed = [self.preprocess_review(review) for review in reviews]
+        results = [None] * len(reviews)
+        valid = [i for i, item in enumerate(preprocessed) if item]
+        
+        if self.collusion_graph is not None:
+            self.collusion_graph.add_reviews(reviews)
+        
+        if valid:
+            try:
+                scores, embeddings = self.score_heads(
+                    [reviews[i] for i in valid], [preprocessed[i] for i in valid], level
+                )
+                rows = np.flatnonzero(~np.any([np.isnan(values) for values in scores.values()], axis=0))
+                indices = [valid[row] for row in rows]
+                
+                group_reviews = [reviews[i] for i in indices]
+                with tracing.span('semantic_search'):
+                    duplicates = self.find_semantic_duplicates(group_reviews, embeddings, rows)
+                with tracing.span('rules'):
+                    features = build_features(group_reviews, [preprocessed[i].get('text_analysis', {}) for i in indices])
+                    patterns = self.build_pattern_predictions_batch(
+                        scores['burst_review'][rows],
+                        scores['copy_paste_review'][rows],
+                        scores['likely_bot'][rows],
+                        None, group_reviews, features
+                    )
+                    fake_scores = scores['fake_review'][rows]
+                    if level == 'rules_only' and self.cascade is None:
+                        # No model at all: the strongest rule-enhanced pattern stands in
+                        fake_scores = [max(pattern['confidence'] for pattern in item.values()) for item in patterns]
+                    fake_predictions = [self.build_fake_prediction(float(score)) for score in fake_scores]
+                    authenticity = self.calculate_review_authenticity_batch(group_reviews, [
+                        {
+                            'isFake': fake_prediction['isFake'],
+                            'confidence': fake_prediction['confidence'],
+                            'suspiciousPatterns': suspicious_patterns
+                        }
+                        for fake_prediction, suspicious_patterns in zip(fake_predictions, patterns)
+                    ], features)
+                
+                for row, i in enumerate(indices):
+                    # One malformed review must not default the rest of a
+                    # micro-batch, which may hold other clients' reviews
+                    try:
+                        results[i] = self.assemble_prediction(
+                            reviews[i], fake_predictions[row], patterns[row], float(authenticity[row]), duplicates[row]
+                        )
+                    except Exception as e:
+                        print(f"Error assembling prediction: {e}")
+            except Exception as e:
+                print(f"Error processing batch: {e}")
+        
+        results = [result if result is not None else self.get_default_prediction() for result in results]
+        for result in results:
+            result['degradationLevel'] = level
+        return results
+    
+    def find_semantic_duplicates(self, reviews, embeddings, rows):
+        """Index and search the embeddings of scored reviews (rows into embeddings)"""
+        if self.semantic_index is None or embeddings is None:
+            return [[] for _ in reviews]
+        try:
+            return self.semantic_index.add_and_search(reviews, embeddings[rows])
+        except Exception as e:
+            print(f"Error searching semantic duplicates: {e}")
+            return [[] for _ in reviews]
+    
+    def score_heads(self, reviews, preprocessed, level='full'):
+        """Raw confidence of every model head, NaN where scoring failed.
+        
+        With the cascade enabled only reviews the stage-1 models are unsure
+        about (plus a small audit sample) go through the LSTM heads, so only
+        those get an embedding (NaN rows otherwise). Returns (scores, embeddings).
+        """
+        if level != 'full':
+            return self.score_heads_degraded(reviews, preprocessed, level), None
+        
+        size = len(reviews)
+        scores = {head: np.full(size, np.nan) for head in MODEL_HEADS}
+        lstm_rows = np.arange(size)
+        
+        if self.cascade is not None:
+            with tracing.span('cascade'):
+                stage1 = self.cascade.predict(
+                    [review.get('reviewText', '') for review in reviews],
+                    [item.get('text_analysis', {}) for item in preprocessed]
+                )
+            escalate = self.cascade.needs_escalation(stage1)
+            audit = self.cascade.sample_audit(~escalate)
+            for head in MODEL_HEADS:
+                scores[head][~escalate] = stage1[head][~escalate]
+            lstm_rows = np.flatnonzero(escalate | audit)
+        
+        lstm_scores, lstm_embeddings = self.run_lstm_heads([preprocessed[row] for row in lstm_rows])
+        embeddings = None
+        if lstm_embeddings is not None:
+            embeddings = np.full((size, lstm_embeddings.shape[1]), np.nan, dtype=np.float32)
+            embeddings[lstm_rows] = lstm_embeddings
+        
+        for head in MODEL_HEADS:
+            # Audited reviews keep their stage-1 score if the LSTM failed
+            current = scores[head][lstm_rows]
+            scores[head][lstm_rows] = np.where(np.isnan(lstm_scores[head]), current, lstm_scores[head])
+        
+        if self.cascade is not None:
+            self.cascade.record(escalate, audit, stage1, lstm_scores, lstm_rows)
+        
+        return scores, embeddings
+    
+    def score_heads_degraded(self, reviews, preprocessed, level):
+        """Head scores under load shedding (fake_only or rules_only).
+        
+        Heads that are skipped take the stage-1 cascade score when there is a
+        cascade and 0.0 otherwise, so only the rule enhancements remain.
+        """
+        size = len(reviews)
+        if self.cascade is not None:
+            with tracing.span('cascade'):
+                scores = self.cascade.predict(
+                    [review.get('reviewText', '') for review in reviews],
+                    [item.get('text_analysis', {}) for item in preprocessed]
+                )
+        else:
+            scores = {head: np.zeros(size) for head in MODEL_HEADS}
+        
+        if level == 'fake_only':
+            lstm_scores, _ = self.run_lstm_heads(preprocessed, ['fake_review'])
+            fallback = scores['fake_review'] if self.cascade is not None else np.full(size, np.nan)
+            scores['fake_review'] = np.where(np.isnan(lstm_scores['fake_review']), fallback, lstm_scores['fake_review'])
+        
+        return scores
+    
+    def run_lstm_heads(self, preprocessed, heads=MODEL_HEADS):
+        """Run LSTM heads over a batch, NaN for rows that failed.
+        
+        Returns (scores, embeddings); embeddings is None without an embedding head.
+        """
+        scores = {head: np.full(len(preprocessed), np.nan) for head in heads}
+        embeddings = None
+        
+        # Group by feature width so a scaler fallback can't break stacking
+        groups = {}
+        for row, item in enumerate(preprocessed):
+            groups.setdefault(item['extra_features'].shape[1], []).append(row)
+        
+        for rows in groups.values():
+            try:
+                text_features = np.vstack([preprocessed[row]['text_features'] for row in rows])
+                extra_features = np.vstack([preprocessed[row]['extra_features'] for row in rows])
+                predictions, group_embeddings = self.session.predict_many(
+                    heads, text_features, extra_features, with_embeddings=True
+                )
+            except Exception as e:
+                print(f"Error predicting batch: {e}")
+                continue
+            for head in heads:
+                scores[head][rows] = predictions[head][:, 0]
+            if group_embeddings is not None:
+                if embeddings is None:
+                    embeddings = np.full((len(preprocessed), group_embeddings.shape[1]), np.nan, dtype=np.float32)
+                embeddings[rows] = group_embeddings
+        
+        return scores, embeddings
+    
+    def assemble_prediction(self, review_data, fake_prediction, suspicious_patterns, review_authenticity=None,
+                            semantic_duplicates=None):
+        """Combine model outputs with sentiment and scoring into the API result"""
+        # Analyze sentiment
+        with tracing.span('sentiment'):
             sentiment_analysis = self.analyze_sentiment(review_data.get('reviewText', ''))
-            
-            # Calculate authenticity
+        
+        # Calculate authenticity (precomputed for batches)
+        if review_authenticity is None:
             review_authenticity = self.calculate_review_authenticity(review_data, {
                 'isFake': fake_prediction['isFake'],
                 'confidence': fake_prediction['confidence'],
                 'suspiciousPatterns': suspicious_patterns
             })
-            
-            # Calculate reviewer credibility (placeholder data)
-            reviewer_credibility = self.calculate_reviewer_credibility({
-                'verifiedPurchases': review_data.get('verifiedPurchase', False),
+        
+        # Calculate reviewer credibility from the reviewer's accumulated history
+        reviewer_id = review_data.get('reviewerId')
+        if reviewer_id and self.reviewer_index is not None:
+            reviewer_stats = self.reviewer_index.record(reviewer_id, review_data, fake_prediction['isFake'])
+        else:
+            # Anonymous review: only what this review tells us
+            reviewer_stats = {
+                'verifiedPurchases': int(bool(review_data.get('verifiedPurchase', False))),
                 'accountAgeDays': review_data.get('accountAgeDays', 30),
                 'fakeReviewsDetected': 0
-            })
-            
-            return {
-                'isFake': fake_prediction['isFake'],
-                'confidence': fake_prediction['confidence'],
-                'riskScore': fake_prediction['riskScore'],
-                'sentiment': sentiment_analysis['sentiment'],
-                'sentimentScore': sentiment_analysis['sentimentScore'],
-                'suspiciousPatterns': suspicious_patterns,
-                'reviewAuthenticity': review_authenticity,
-                'reviewerCredibility': reviewer_credibility,
-                # Detailed model outputs
-                'burstReviewDetected': suspicious_patterns['burst_reviews']['detected'],
-                'burstReviewConfidence': suspicious_patterns['burst_reviews']['confidence'],
-                'copyPasteDetected': suspicious_patterns['copy_paste']['detected'],
-                'copyPasteConfidence': suspicious_patterns['copy_paste']['confidence'],
-                'botActivityDetected': suspicious_patterns['bot_activity']['detected'],
-                'botActivityConfidence': suspicious_patterns['bot_activity']['confidence']
             }
-            
-        except Exception as e:
-            print(f"Error processing review: {e}")
-            return self.get_default_prediction()
+        reviewer_credibility = self.calculate_reviewer_credibility(reviewer_stats)
+        
+        return {
+            'isFake': fake_prediction['isFake'],
+            'confidence': fake_prediction['confidence'],
+            'riskScore': fake_prediction['riskScore'],
+            'sentiment': sentiment_analysis['sentiment'],
+            'sentimentScore': sentiment_analysis['sentimentScore'],
+            'suspiciousPatterns': suspicious_patterns,
+            'reviewAuthenticity': review_authenticity,
+            'reviewerCredibility': reviewer_credibility,
+            # Other reviews of the same seller/product with a near-identical embedding
+            'semanticDuplicates': semantic_duplicates or [],
+            # Detailed model outputs
+            'burstReviewDetected': suspicious_patterns['burst_reviews']['detected'],
+            'burstReviewConfidence': suspicious_patterns['burst_reviews']['confidence'],
+            'copyPasteDetected': suspicious_patterns['copy_paste']['detected'],
+            'copyPasteConfidence': suspicious_patterns['copy_paste']['confidence'],
+            'botActivityDetected': suspicious_patterns['bot_activity']['detected'],
+            'botActivityConfidence': suspicious_patterns['bot_activity']['confidence']
+        }
     
-    def calculate_seller_risk_score(self, seller_reviews):
+    def calculate_seller_risk_score(self, seller_reviews, predictions=None, seller_id=None):
         """
         Calculate seller risk score based on all their reviews
         
         Args:
             seller_reviews: List of review dictionaries for a seller
+            predictions: Optional process_review results for seller_reviews,
+                e.g. from an async job; scored here when omitted
+            seller_id: Seller the reviews belong to, for collusion analysis
             
         Returns:
             dict: Seller risk assessment with score and breakdown
@@ -520,18 +724,19 @@ class FakeReviewDetector:
         }
         risk_factors = []
         
+        # Get ML predictions for all reviews in one batch
+        if predictions is None:
+            predictions = self.process_reviews(seller_reviews)
+        
         # Analyze each review
-        for review in seller_reviews:
+        for review, review_predictions in zip(seller_reviews, predictions):
             try:
-                # Get ML predictions for this review
-                predictions = self.predict_fake_review(review)
-                
-                if predictions['isFake']:
+                if review_predictions['isFake']:
                     fake_reviews += 1
                 
                 # Check suspicious patterns
-                if predictions.get('suspiciousPatterns'):
-                    patterns = predictions['suspiciousPatterns']
+                if review_predictions.get('suspiciousPatterns'):
+                    patterns = review_predictions['suspiciousPatterns']
                     if patterns.get('burst_reviews', {}).get('detected', False):
                         suspicious_patterns['burst_reviews'] += 1
                     if patterns.get('copy_paste', {}).get('detected', False):
@@ -548,6 +753,17 @@ class FakeReviewDetector:
                 print(f"Error analyzing review: {e}")
                 continue
         
+        # Reviewer/IP rings touching this seller
+        collusion = {'ratio': 0.0, 'rings': 0, 'largest_ring': 0, 'reviewers_in_rings': 0}
+        if self.collusion_graph is not None:
+            try:
+                # process_reviews already added the reviews; requests that only
+                # carry a top-level sellerId still need their seller edges
+                self.collusion_graph.link_seller(seller_reviews, seller_id)
+                collusion = self.collusion_graph.seller_collusion(seller_id or seller_reviews[0].get('sellerId'))
+            except Exception as e:
+                print(f"Error analyzing collusion: {e}")
+        
         # Calculate risk factors
         fake_review_percentage = (fake_reviews / total_reviews) * 100 if total_reviews > 0 else 0
         
@@ -566,6 +782,11 @@ class FakeReviewDetector:
         if suspicious_patterns['short_reviews'] > total_reviews * 0.3:
             risk_factors.append(f"High percentage of short reviews: {suspicious_patterns['short_reviews']}")
         
+        if collusion['rings'] > 0:
+            risk_factors.append(
+                f"Collusion rings detected: {collusion['reviewers_in_rings']} reviewers in {collusion['rings']} ring(s)"
+            )
+        
         # Calculate overall risk score (0-100)
         risk_score = 0
         
@@ -588,6 +809,9 @@ class FakeReviewDetector:
         if total_reviews > 50:
             risk_score += 5
         
+        # Collusion factor - share of reviewers in reviewer/IP rings
+        risk_score += collusion['ratio'] * 100 * 0.2
+        
         # Cap at 100
         risk_score = min(risk_score, 100)
         
@@ -607,15 +831,26 @@ class FakeReviewDetector:
             'fake_review_percentage': round(fake_review_percentage, 2),
             'suspicious_patterns': suspicious_patterns,
             'risk_factors': risk_factors,
+            'collusion': collusion,
             'last_updated': datetime.now().isoformat()
         }
 
-# Global instance
-detector = FakeReviewDetector()
+# Global instance, created on first use so importing this module stays cheap
+_detector = None
+_detector_lock = threading.Lock()
+
+def get_detector():
+    """Return the process-wide detector, loading models exactly once"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = FakeReviewDetector()
+    return _detector
 
 def process_review_api(review_data):
     """API function to process review data"""
-    return detector.process_review(review_data)
+    return get_detector().process_review(review_data)
 
 if __name__ == "__main__":
     # Test the detector
@@ -627,5 +862,5 @@ if __name__ == "__main__":
         'verifiedPurchase': True
     }
     
-    result = detector.process_review(test_review)
+    result = get_detector().process_review(test_review)
     print("Test Result:", json.dumps(result, indent=2)) 
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for the ML service.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Each worker process loads the models once; request threads share them (see
+inference.py). Models are not preloaded in the master because TensorFlow
+does not survive fork(). Every worker warms its models up in
+post_worker_init, before it starts accepting connections, so a cold or
+recycled worker never answers a request; point the load balancer's
+readiness check at /ready and liveness at /health.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = False
+
+
+def post_worker_init(worker):
+    """Warm up synchronously; the app module is already loaded in this worker"""
+    import app as service
+    service.readiness.run(service.detector, service.scheduler.micro_batch_size, notify=worker.notify)
@@ -0,0 +1,116 @@
+"""
+Thread-safe inference for the review models.
+
+Concurrency model
+-----------------
+* Loaded artifacts (tokenizer, scaler, Keras models) are read-only after
+  FakeReviewDetector.load_models() returns. Nothing on the request path
+  mutates them; vocabulary growth happens offline (see vocabulary.py).
+* Keras `Model.predict` is not meant to be called from several threads at
+  once (it builds a data adapter and step counters per call) and holds the
+  GIL for most of its Python-side bookkeeping. Instead every model is wrapped
+  once in a `tf.function` with a batch-polymorphic input signature. Calling
+  the traced graph is thread-safe and the graph runs in C++ with the GIL
+  released, so gthread workers really execute inference in parallel.
+* A bounded semaphore caps the number of graphs executing at the same time
+  so hundreds of request threads do not oversubscribe TensorFlow's own
+  intra-op thread pool.
+* The embedding head (copy_paste_review by default) is traced with a second
+  output, its LSTM representation, so semantic duplicate search gets review
+  embeddings from the same forward pass.
+
+Environment:
+    TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS   TensorFlow thread pools
+    INFERENCE_MAX_CONCURRENCY                   concurrent graph executions
+    SEMANTIC_EMBEDDING_HEAD                     head whose LSTM output is the embedding
+"""
+
+import os
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+import tracing
+
+
+def configure_threading():
+    """Apply TF thread-pool settings; must run before the first TF op"""
+    intra = int(os.environ.get('TF_INTRA_OP_THREADS', 0))
+    inter = int(os.environ.get('TF_INTER_OP_THREADS', 0))
+    try:
+        if intra:
+            tf.config.threading.set_intra_op_parallelism_threads(intra)
+        if inter:
+            tf.config.threading.set_inter_op_parallelism_threads(inter)
+    except RuntimeError:
+        # TF is already initialised (e.g. a second detector in this process)
+        pass
+
+
+configure_threading()
+
+
+class InferenceSession:
+    """Shared, stateless inference over a fixed set of Keras models"""
+
+    def __init__(self, models, max_concurrency=None, embedding_head=None):
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get('INFERENCE_MAX_CONCURRENCY', os.cpu_count() or 4))
+        self._semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.embedding_head = embedding_head or os.environ.get('SEMANTIC_EMBEDDING_HEAD', 'copy_paste_review')
+        if self.embedding_head in models:
+            models = dict(models)
+            models[self.embedding_head] = self._with_embedding(models[self.embedding_head])
+        else:
+            self.embedding_head = None
+        self._functions = {name: self._compile(model) for name, model in models.items()}
+
+    @staticmethod
+    def _with_embedding(model):
+        """Same model with the last LSTM layer's output as a second output"""
+        lstm_layers = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.LSTM)]
+        if not lstm_layers:
+            return model
+        return tf.keras.Model(inputs=model.inputs, outputs=[model.output, lstm_layers[-1].output])
+
+    @staticmethod
+    def _compile(model):
+        @tf.function(input_signature=[
+            tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+            tf.TensorSpec(shape=[None, None], dtype=tf.float32)
+        ])
+        def infer(text_features, extra_features):
+            return model([text_features, extra_features], training=False)
+
+        return infer
+
+    def has_model(self, name):
+        return name in self._functions
+
+    def _run(self, name, text_features, extra_features):
+        text_features = np.asarray(text_features, dtype=np.float32)
+        extra_features = np.asarray(extra_features, dtype=np.float32)
+        with tracing.span(f"model:{name}", batch=len(text_features)), self._semaphore:
+            output = self._functions[name](text_features, extra_features)
+        if isinstance(output, (list, tuple)):
+            return output[0].numpy(), output[1].numpy()
+        return output.numpy(), None
+
+    def predict(self, name, text_features, extra_features):
+        """Run one model on a batch and return a NumPy array of scores"""
+        return self._run(name, text_features, extra_features)[0]
+
+    def predict_many(self, names, text_features, extra_features, with_embeddings=False):
+        """Run several models on the same batch.
+
+        With with_embeddings, returns (scores, embeddings) where embeddings is
+        the embedding head's LSTM output, or None if it has none.
+        """
+        scores = {}
+        embeddings = None
+        for name in names:
+            scores[name], output = self._run(name, text_features, extra_features)
+            if output is not None:
+                embeddings = output
+        return (scores, embeddings) if with_embeddings else scores
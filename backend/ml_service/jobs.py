@@ -0,0 +1,325 @@
+"""
+Asynchronous scoring jobs persisted in SQLite.
+
+Large batch and seller-risk requests are submitted as jobs instead of
+holding an HTTP connection open. A submitted job's reviews are written to
+the database up front; worker threads score them in chunks through the
+scheduler's bulk class (so jobs still yield to interactive traffic) and
+store each prediction as soon as its chunk finishes. Clients poll for
+progress and fetch results in pages or as an NDJSON stream.
+
+Because every scored chunk is committed, a restart loses nothing: queued
+and interrupted jobs are picked up again and only their unscored reviews
+are processed.
+
+Every server process (gunicorn worker) shares the database, so a job is
+claimed atomically before it runs: the claiming UPDATE only succeeds while
+the job is queued or its owner's lease has expired. The owner renews the
+lease between chunks; a job whose owner died is reclaimed by another
+process once the lease runs out. Status changes after the claim (cancel,
+complete, fail) are conditional too, so a cancel is never overwritten.
+
+Environment:
+    JOBS_DB_PATH         SQLite file (default ./jobs.db)
+    JOBS_WORKERS         job worker threads (default 2)
+    JOBS_CHUNK_SIZE      reviews scored and committed per step (default 256)
+    JOBS_LEASE_SECONDS   how long a claim lasts without renewal (default 120)
+"""
+
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+JOB_KINDS = ('batch', 'seller-risk')
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT,
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    review TEXT NOT NULL,
+    result TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+# Columns added after the first release; older databases are migrated on open
+LEASE_COLUMNS = {'owner': 'TEXT', 'lease_until': 'REAL'}
+
+
+class JobStore:
+    """Thin SQLite wrapper; one connection per thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for name, column_type in LEASE_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {name} {column_type}')
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind, reviews, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.connection() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, params, total, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, 'queued', json.dumps(params), len(reviews), now, now)
+            )
+            conn.executemany(
+                'INSERT INTO job_items (job_id, idx, review) VALUES (?, ?, ?)',
+                ((job_id, idx, json.dumps(review)) for idx, review in enumerate(reviews))
+            )
+        return job_id
+
+    def get(self, job_id):
+        row = self.connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def claim(self, job_id, owner, lease_seconds):
+        """Take a queued job, or one whose lease expired; True if this owner got it"""
+        now = time.time()
+        with self.connection() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND (status = 'queued' OR "
+                "(status = 'running' AND (lease_until IS NULL OR lease_until < ?)))",
+                (owner, now + lease_seconds, now, job_id, now)
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, job_id, owner, lease_seconds):
+        """Extend the lease; False once the job was cancelled or reclaimed"""
+        now = time.time()
+        with self.connection() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, owner)
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, owner, status, error=None, result=None):
+        """Move a job this owner is running to a final status"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                'UPDATE jobs SET status = ?, error = COALESCE(?, error), result = COALESCE(?, result), '
+                "lease_until = NULL, updated_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, error, json.dumps(result) if result is not None else None, time.time(), job_id, owner)
+            )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id):
+        """Cancel a job that has not reached a final status"""
+        with self.connection() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', lease_until = NULL, updated_at = ? "
+                f"WHERE id = ? AND status NOT IN ({', '.join('?' * len(FINAL_STATUSES))})",
+                (time.time(), job_id, *FINAL_STATUSES)
+            )
+        return cursor.rowcount == 1
+
+    def claimable(self):
+        """Queued jobs and running jobs whose owner stopped renewing"""
+        rows = self.connection().execute(
+            "SELECT id FROM jobs WHERE status = 'queued' OR "
+            "(status = 'running' AND (lease_until IS NULL OR lease_until < ?)) ORDER BY created_at",
+            (time.time(),)
+        ).fetchall()
+        return [row['id'] for row in rows]
+
+    def pending_items(self, job_id, limit):
+        rows = self.connection().execute(
+            'SELECT idx, review FROM job_items WHERE job_id = ? AND result IS NULL ORDER BY idx LIMIT ?',
+            (job_id, limit)
+        ).fetchall()
+        return [(row['idx'], json.loads(row['review'])) for row in rows]
+
+    def save_results(self, job_id, indexed_results):
+        with self.connection() as conn:
+            conn.executemany(
+                'UPDATE job_items SET result = ? WHERE job_id = ? AND idx = ?',
+                ((json.dumps(result), job_id, idx) for idx, result in indexed_results)
+            )
+            conn.execute(
+                'UPDATE jobs SET completed = (SELECT COUNT(*) FROM job_items WHERE job_id = ? AND result IS NOT NULL), '
+                'updated_at = ? WHERE id = ?',
+                (job_id, time.time(), job_id)
+            )
+
+    def items(self, job_id, offset, limit, scored_only=True):
+        condition = 'AND result IS NOT NULL' if scored_only else ''
+        rows = self.connection().execute(
+            f'SELECT idx, review, result FROM job_items WHERE job_id = ? {condition} '
+            'ORDER BY idx LIMIT ? OFFSET ?',
+            (job_id, limit, offset)
+        ).fetchall()
+        return [
+            (row['idx'], json.loads(row['review']), json.loads(row['result']) if row['result'] else None)
+            for row in rows
+        ]
+
+    def items_from(self, job_id, start_idx, limit):
+        rows = self.connection().execute(
+            'SELECT idx, review, result FROM job_items WHERE job_id = ? AND idx >= ? ORDER BY idx LIMIT ?',
+            (job_id, start_idx, limit)
+        ).fetchall()
+        return [
+            (row['idx'], json.loads(row['review']), json.loads(row['result']) if row['result'] else None)
+            for row in rows
+        ]
+
+
+class JobManager:
+    """Runs persisted jobs on a pool of worker threads"""
+
+    def __init__(self, detector, scheduler, db_path=None, workers=None, chunk_size=None):
+        self.detector = detector
+        self.scheduler = scheduler
+        self.store = JobStore(db_path or os.environ.get('JOBS_DB_PATH', './jobs.db'))
+        self.chunk_size = chunk_size or int(os.environ.get('JOBS_CHUNK_SIZE', 256))
+        self.lease_seconds = float(os.environ.get('JOBS_LEASE_SECONDS', 120))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = queue.Queue()
+
+        # Resume whatever is queued or was left running by a process that stopped
+        for job_id in self.store.claimable():
+            self._queue.put(job_id)
+
+        workers = workers or int(os.environ.get('JOBS_WORKERS', 2))
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"jobs-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, kind, reviews, params=None):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = self.store.create(kind, reviews, params or {})
+        self._queue.put(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        return self.store.cancel(job_id)
+
+    def status(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        return {
+            'jobId': job['id'],
+            'kind': job['kind'],
+            'status': job['status'],
+            'total': job['total'],
+            'completed': job['completed'],
+            'progress': job['completed'] / job['total'] if job['total'] else 1.0,
+            'error': job['error'],
+            'createdAt': job['created_at'],
+            'updatedAt': job['updated_at']
+        }
+
+    def result(self, job_id):
+        """Final result of a seller-risk job"""
+        job = self.store.get(job_id)
+        return json.loads(job['result']) if job and job['result'] else None
+
+    def results_page(self, job_id, offset=0, limit=100):
+        return [
+            {'reviewId': review.get('reviewId'), 'predictions': result}
+            for _, review, result in self.store.items(job_id, offset, limit)
+        ]
+
+    def stream(self, job_id, poll_interval=0.5, page_size=500):
+        """Yield results in order as they are scored, until the job finishes"""
+        next_idx = 0
+        while True:
+            rows = self.store.items_from(job_id, next_idx, page_size)
+            progressed = False
+            for idx, review, result in rows:
+                if result is None:
+                    break
+                yield {'reviewId': review.get('reviewId'), 'predictions': result}
+                next_idx = idx + 1
+                progressed = True
+
+            if progressed:
+                continue
+            job = self.store.get(job_id)
+            if job is None or (job['status'] in FINAL_STATUSES and next_idx >= job['completed']):
+                return
+            time.sleep(poll_interval)
+
+    def _worker(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.lease_seconds)
+            except queue.Empty:
+                # Pick up jobs whose owner died; claim() settles races between processes
+                for job_id in self.store.claimable():
+                    self._queue.put(job_id)
+                continue
+            try:
+                self._run(job_id)
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+                self.store.finish(job_id, self.owner, 'failed', error=str(e))
+
+    def _run(self, job_id):
+        if not self.store.claim(job_id, self.owner, self.lease_seconds):
+            return
+        job = self.store.get(job_id)
+
+        while True:
+            items = self.store.pending_items(job_id, self.chunk_size)
+            if not items:
+                break
+            predictions = self.scheduler.run([review for _, review in items], 'bulk')
+            self.store.save_results(job_id, [(idx, prediction) for (idx, _), prediction in zip(items, predictions)])
+            # Fails once the job was cancelled or another process took it over
+            if not self.store.renew(job_id, self.owner, self.lease_seconds):
+                return
+
+        result = None
+        if job['kind'] == 'seller-risk':
+            rows = self.store.items(job_id, 0, job['total'])
+            params = json.loads(job['params'] or '{}')
+            result = self.detector.calculate_seller_risk_score(
+                [review for _, review, _ in rows],
+                predictions=[prediction for _, _, prediction in rows],
+                seller_id=params.get('sellerId')
+            )
+        self.store.finish(job_id, self.owner, 'completed', result=result)
@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+"""
+Load-test harness for the ML service, run entirely on localhost.
+
+A small client stands in for the Node backend and replays
+sample-reviews.json-shaped traffic (the fields ml.service.js sends, plus
+sellerId) against:
+
+    review       POST /predict/review, one review per request
+    batch        POST /predict/batch with --batch-size reviews
+    seller-risk  POST /predict/seller-risk with one seller's reviews
+    node-loop    what ml.controller.js does for an upload: --loop-size
+                 sequential /predict/review calls, timed as one operation
+
+Requests are issued open-loop at --rps (latency is measured from the
+scheduled send time, so a stalled server cannot hide queueing), or
+closed-loop as fast as --concurrency clients allow when --rps is 0. While the
+load runs, the resident memory of the server process tree is sampled from
+/proc.
+
+    # against a server that is already running
+    python loadtest.py run --url http://localhost:5001 --rps 50 --duration 60
+
+    # start each server configuration in turn and compare them
+    python loadtest.py compare --configs flask-debug gunicorn-sync gunicorn-gthread gunicorn-gevent \\
+        --rps 50 --duration 60 --mix review=0.8,batch=0.1,seller-risk=0.1
+
+    # what shadow scoring costs the primary (compare the p99 columns)
+    python loadtest.py compare --configs gunicorn-gthread gunicorn-gthread-shadow --rps 50 --duration 120
+
+Reviews come from --reviews (a JSON list, or an object with a "reviews"
+list; default the repository's sample-reviews.json); --reviews generate
+uses a synthetic set of --generate reviews instead. Configurations whose
+server (gunicorn, gevent) is not installed are skipped and reported as such.
+
+Each configuration runs with its own temporary state directory: the reviewer
+index, semantic index, jobs database, traces, OOV counts and shadow database
+all point there (REVIEWER_INDEX_PATH, SEMANTIC_INDEX_PATH, JOBS_DB_PATH,
+TRACE_DIR, OOV_COUNTS_PATH, SHADOW_DB_PATH). The reviewer and semantic
+indexes start as copies of the ones in ml_models/, so every configuration
+starts from the same state, and the load-test reviews saved at shutdown never
+reach the production files. The directory is removed afterwards
+(--keep-state keeps it).
+"""
+
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import queue
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from metrics import percentile
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_REVIEWS = os.path.join(SERVICE_DIR, '..', '..', 'sample-reviews.json')
+
+# Server state copied into each configuration's directory so every run starts alike
+SEEDED_STATE = {
+    'REVIEWER_INDEX_PATH': 'reviewer_index.npz',
+    'SEMANTIC_INDEX_PATH': 'semantic_index.bin'
+}
+# Server state each configuration starts without
+FRESH_STATE = {
+    'JOBS_DB_PATH': 'jobs.db',
+    'TRACE_DIR': 'traces',
+    'OOV_COUNTS_PATH': 'oov_counts.json',
+    'SHADOW_DB_PATH': 'shadow.db'
+}
+
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+SCENARIOS = ['review', 'batch', 'seller-risk', 'node-loop']
+
+GUNICORN = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+
+SERVER_CONFIGS = {
+    'flask-debug': {
+        'command': [sys.executable, 'app.py'],
+        'env': {},
+        'requires': []
+    },
+    'gunicorn-sync': {
+        'command': GUNICORN,
+        # gunicorn silently switches sync to gthread when threads > 1
+        'env': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_THREADS': '1'},
+        'requires': ['gunicorn']
+    },
+    'gunicorn-gthread': {
+        'command': GUNICORN,
+        'env': {'GUNICORN_WORKER_CLASS': 'gthread'},
+        'requires': ['gunicorn']
+    },
+    'gunicorn-gevent': {
+        'command': GUNICORN,
+        'env': {'GUNICORN_WORKER_CLASS': 'gevent'},
+        'requires': ['gunicorn', 'gevent']
+    },
+    'gunicorn-gthread-shadow': {
+        'command': GUNICORN,
+        # The primary bundle stands in for a candidate; only the shadowing cost differs
+        'env': {'GUNICORN_WORKER_CLASS': 'gthread', 'SHADOW_MODELS_DIR': './ml_models'},
+        'requires': ['gunicorn']
+    }
+}
+
+REVIEW_TEXTS = [
+    "This product is amazing! I love it so much. Best purchase ever!",
+    "Great product, fast shipping, excellent quality, highly recommend, would buy again",
+    "I bought this last week and it works well. The quality is decent for the price.",
+    "Terrible. Broke after two days and support never answered my emails.",
+    "Product arrived on time. Good quality. Satisfied with purchase. Will recommend to friends.",
+    "The fit is a little small, so order one size up. Fabric feels sturdy after several washes.",
+    "Battery life is shorter than advertised, about six hours instead of ten. Otherwise fine.",
+    "Perfect!!! Amazing!!! Best seller ever!!! Five stars!!!"
+]
+
+
+def generate_reviews(count, sellers=20, seed=0):
+    """Synthetic reviews with the fields the Node backend sends"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    reviews = []
+    for i in range(count):
+        seller = rng.randrange(sellers)
+        product = seller * 10 + rng.randrange(10)
+        reviews.append({
+            'reviewId': f"review_{i}",
+            'reviewText': rng.choice(REVIEW_TEXTS),
+            'rating': rng.choice([1, 2, 3, 4, 5, 5, 5]),
+            'reviewerId': f"reviewer_{rng.randrange(count // 3 + 1)}",
+            'productId': f"product_{product}",
+            'productName': f"Product {product}",
+            'sellerId': f"seller_{seller}",
+            'reviewDate': (start + timedelta(minutes=rng.randrange(60 * 24 * 180))).isoformat() + 'Z',
+            'ipAddress': f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+            'verifiedPurchase': rng.random() < 0.7
+        })
+    return reviews
+
+
+def load_reviews(path, count):
+    if path == 'generate':
+        return generate_reviews(count)
+    with open(path, 'r') as f:
+        data = json.load(f)
+    reviews = data['reviews'] if isinstance(data, dict) else data
+    if not reviews:
+        raise ValueError(f"No reviews in {path}")
+    return reviews
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; expected one of {SCENARIOS}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Client:
+    """Keep-alive HTTP client for one load-generating thread"""
+
+    def __init__(self, url, timeout):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def post(self, path, payload):
+        """Return (ok, status)"""
+        body = json.dumps(payload).encode('utf-8')
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.status != 200:
+                    return False, response.status
+                return bool(json.loads(data).get('success', False)), response.status
+            except (http.client.HTTPException, ConnectionError, OSError):
+                # Stale keep-alive connection: reconnect once
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    return False, None
+        return False, None
+
+
+class Workload:
+    """Builds the request(s) for each scenario from the review set"""
+
+    def __init__(self, reviews, batch_size, seller_size, loop_size):
+        self.reviews = reviews
+        self.batch_size = batch_size
+        self.seller_size = seller_size
+        self.loop_size = loop_size
+        self.by_seller = {}
+        for review in reviews:
+            self.by_seller.setdefault(review.get('sellerId', 'unknown_seller'), []).append(review)
+        self.sellers = sorted(self.by_seller)
+
+    def _slice(self, i, size):
+        start = (i * size) % len(self.reviews)
+        chunk = self.reviews[start:start + size]
+        return chunk + self.reviews[:size - len(chunk)]
+
+    def execute(self, client, scenario, i):
+        """Send one operation; returns (ok, reviews scored, status)"""
+        if scenario == 'review':
+            ok, status = client.post('/predict/review', self.reviews[i % len(self.reviews)])
+            return ok, 1, status
+        if scenario == 'batch':
+            reviews = self._slice(i, self.batch_size)
+            ok, status = client.post('/predict/batch', {'reviews': reviews})
+            return ok, len(reviews), status
+        if scenario == 'seller-risk':
+            seller = self.sellers[i % len(self.sellers)]
+            reviews = self.by_seller[seller][:self.seller_size]
+            ok, status = client.post('/predict/seller-risk', {'sellerId': seller, 'reviews': reviews})
+            return ok, len(reviews), status
+        # node-loop: one review at a time, like the Node upload handler
+        status = None
+        for review in self._slice(i, self.loop_size):
+            ok, status = client.post('/predict/review', review)
+            if not ok:
+                return False, 0, status
+        return True, self.loop_size, status
+
+
+class ProcessTreeSampler:
+    """Samples VmRSS of a process and all its descendants from /proc"""
+
+    def __init__(self, root_pid, interval):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _children(root_pid):
+        parents = {}
+        for name in os.listdir('/proc'):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat", 'r') as f:
+                    # The command name may contain spaces; fields resume after ')'
+                    fields = f.read().rpartition(')')[2].split()
+                parents.setdefault(int(fields[1]), []).append(int(name))
+            except (OSError, IndexError, ValueError):
+                continue
+        tree, stack = [], [root_pid]
+        while stack:
+            pid = stack.pop()
+            tree.append(pid)
+            stack.extend(parents.get(pid, []))
+        return tree
+
+    @staticmethod
+    def _rss_mb(pid):
+        try:
+            with open(f"/proc/{pid}/status", 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return 0.0
+
+    def sample(self):
+        processes = {pid: self._rss_mb(pid) for pid in self._children(self.root_pid)}
+        return {'total_mb': sum(processes.values()), 'processes': processes}
+
+    def start(self):
+        started = time.monotonic()
+
+        def run():
+            while not self._stop.is_set():
+                sample = self.sample()
+                sample['t'] = time.monotonic() - started
+                self.samples.append(sample)
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=run, name='rss-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def run_load(url, workload, mix, rps, concurrency, duration, timeout, seed=0):
+    """Drive the server for `duration` seconds; returns raw operation records"""
+    rng = random.Random(seed)
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+    records = []
+    records_lock = threading.Lock()
+    tickets = queue.Queue()
+    started = time.monotonic()
+    deadline = started + duration
+
+    def execute(client, scenario, i, scheduled):
+        begin = time.monotonic()
+        ok, reviews, status = workload.execute(client, scenario, i)
+        end = time.monotonic()
+        with records_lock:
+            records.append({
+                'scenario': scenario,
+                'ok': ok,
+                'status': status,
+                'reviews': reviews,
+                # Open loop: from the scheduled send time; closed loop: from the actual send
+                'latency_ms': (end - scheduled) * 1000,
+                'service_ms': (end - begin) * 1000,
+                'finished': end - started
+            })
+
+    def open_loop_worker():
+        client = Client(url, timeout)
+        while True:
+            ticket = tickets.get()
+            if ticket is None:
+                return
+            execute(client, *ticket)
+
+    def closed_loop_worker(worker_id):
+        client = Client(url, timeout)
+        local_rng = random.Random(seed + worker_id)
+        i = worker_id
+        while time.monotonic() < deadline:
+            scenario = local_rng.choices(scenarios, weights)[0]
+            execute(client, scenario, i, time.monotonic())
+            i += concurrency
+
+    if rps:
+        threads = [threading.Thread(target=open_loop_worker, daemon=True) for _ in range(concurrency)]
+    else:
+        threads = [threading.Thread(target=closed_loop_worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    if rps:
+        i = 0
+        next_send = started
+        while next_send < deadline:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            tickets.put((rng.choices(scenarios, weights)[0], i, next_send))
+            i += 1
+            next_send += 1.0 / rps
+        for _ in threads:
+            tickets.put(None)
+
+    for thread in threads:
+        thread.join()
+    return records, time.monotonic() - started
+
+
+def summarize(records, elapsed, rss_samples):
+    summary = {'elapsed_s': elapsed, 'scenarios': {}}
+    for scenario in sorted({record['scenario'] for record in records}):
+        rows = [record for record in records if record['scenario'] == scenario]
+        succeeded = [record for record in rows if record['ok']]
+        latency = [record['latency_ms'] for record in succeeded]
+        service = [record['service_ms'] for record in succeeded]
+        summary['scenarios'][scenario] = {
+            'operations': len(rows),
+            'errors': len(rows) - len(succeeded),
+            'ops_per_s': len(succeeded) / elapsed if elapsed else 0.0,
+            'reviews_per_s': sum(record['reviews'] for record in succeeded) / elapsed if elapsed else 0.0,
+            'latency_ms': {p: percentile(latency, p) for p in (50, 95, 99)},
+            'service_ms': {p: percentile(service, p) for p in (50, 95, 99)},
+            'status_codes': {
+                str(code): sum(1 for record in rows if record['status'] == code)
+                for code in {record['status'] for record in rows}
+            }
+        }
+    if rss_samples:
+        summary['rss_mb'] = {
+            'start': rss_samples[0]['total_mb'],
+            'peak': max(sample['total_mb'] for sample in rss_samples),
+            'end': rss_samples[-1]['total_mb'],
+            'timeline': [{'t': round(sample['t'], 2), 'total_mb': round(sample['total_mb'], 1)}
+                         for sample in rss_samples]
+        }
+    return summary
+
+
+def check_local(url):
+    host = urlparse(url).hostname
+    if host not in LOCAL_HOSTS:
+        raise SystemExit(f"Refusing to load-test {host}: this harness only targets localhost")
+
+
+def wait_until_ready(url, timeout, process=None):
+    """Poll /ready (falling back to /health) until the server takes traffic"""
+    parsed = urlparse(url)
+    deadline = time.monotonic() + timeout
+    path = '/ready'
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=5)
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status == 200:
+                return True
+            if response.status == 404:
+                path = '/health'
+        except (http.client.HTTPException, OSError):
+            pass
+        time.sleep(1)
+    return False
+
+
+def state_dir(name):
+    """Temporary server state for one configuration, seeded from ml_models/"""
+    directory = tempfile.mkdtemp(prefix=f"loadtest-{name}-")
+    env = {}
+    for variable, filename in SEEDED_STATE.items():
+        env[variable] = os.path.join(directory, filename)
+        source = os.path.join(SERVICE_DIR, 'ml_models', filename)
+        if os.path.exists(source):
+            shutil.copyfile(source, env[variable])
+    for variable, filename in FRESH_STATE.items():
+        env[variable] = os.path.join(directory, filename)
+    return directory, env
+
+
+def start_server(name, port, log_path, state_env):
+    config = SERVER_CONFIGS[name]
+    env = dict(os.environ, PORT=str(port), **state_env)
+    # Only the shadow configuration shadows, whatever the calling shell has set
+    env.pop('SHADOW_MODELS_DIR', None)
+    env.update(config['env'])
+    log = open(log_path, 'w')
+    process = subprocess.Popen(
+        config['command'], cwd=SERVICE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        start_new_session=True
+    )
+    return process, log
+
+
+def stop_server(process, log):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except ProcessLookupError:
+        pass
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    log.close()
+
+
+def missing_requirements(name):
+    return [module for module in SERVER_CONFIGS[name]['requires'] if importlib.util.find_spec(module) is None]
+
+
+def measure(url, workload, args, server_pid=None):
+    sampler = ProcessTreeSampler(server_pid, args.rss_interval) if server_pid else None
+    if sampler is not None:
+        sampler.start()
+    try:
+        records, elapsed = run_load(
+            url, workload, args.mix, args.rps, args.concurrency, args.duration, args.timeout, args.seed
+        )
+    finally:
+        if sampler is not None:
+            sampler.stop()
+    return summarize(records, elapsed, sampler.samples if sampler else [])
+
+
+def print_summary(name, summary):
+    print(f"\n== {name} ==")
+    if 'skipped' in summary:
+        print(f"  skipped: {summary['skipped']}")
+        return
+    print(f"  {'scenario':12s} {'ops':>7s} {'err':>5s} {'ops/s':>8s} {'reviews/s':>10s} "
+          f"{'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+    for scenario, stats in summary['scenarios'].items():
+        latency = stats['latency_ms']
+        cells = [f"{latency[p]:9.1f}" if latency[p] is not None else f"{'-':>9s}" for p in (50, 95, 99)]
+        print(f"  {scenario:12s} {stats['operations']:7d} {stats['errors']:5d} {stats['ops_per_s']:8.1f} "
+              f"{stats['reviews_per_s']:10.1f} " + ' '.join(cells))
+    if 'rss_mb' in summary:
+        rss = summary['rss_mb']
+        print(f"  RSS (MB): start {rss['start']:.0f}, peak {rss['peak']:.0f}, end {rss['end']:.0f}")
+
+
+def command_run(args, workload):
+    check_local(args.url)
+    summary = measure(args.url, workload, args, args.server_pid)
+    print_summary(args.url, summary)
+    return {'url': args.url, 'summary': summary}
+
+
+def command_compare(args, workload):
+    url = f"http://127.0.0.1:{args.port}"
+    os.makedirs(args.log_dir, exist_ok=True)
+    results = {}
+    for name in args.configs:
+        missing = missing_requirements(name)
+        if missing:
+            results[name] = {'skipped': f"not installed: {', '.join(missing)}"}
+            print_summary(name, results[name])
+            continue
+
+        directory, state_env = state_dir(name)
+        print(f"\nStarting {name} on port {args.port} (state in {directory})...")
+        process, log = start_server(name, args.port, os.path.join(args.log_dir, f"{name}.log"), state_env)
+        try:
+            if not wait_until_ready(url, args.startup_timeout, process):
+                results[name] = {'skipped': f"server not ready within {args.startup_timeout}s (see {log.name})"}
+            else:
+                results[name] = measure(url, workload, args, process.pid)
+        finally:
+            stop_server(process, log)
+            if not args.keep_state:
+                shutil.rmtree(directory, ignore_errors=True)
+        print_summary(name, results[name])
+    return {'configs': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Localhost load test for the ML service')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--reviews', default=DEFAULT_REVIEWS,
+                        help="sample-reviews.json-style file, or 'generate' for a synthetic set")
+    common.add_argument('--generate', type=int, default=2000, help='reviews to generate with --reviews generate')
+    common.add_argument('--mix', type=parse_mix, default=parse_mix('review=1'),
+                        help=f"weighted scenarios, e.g. review=0.8,batch=0.2 ({', '.join(SCENARIOS)})")
+    common.add_argument('--rps', type=float, default=20, help='operations per second; 0 for closed loop')
+    common.add_argument('--concurrency', type=int, default=16)
+    common.add_argument('--duration', type=float, default=30, help='seconds of load')
+    common.add_argument('--batch-size', type=int, default=50)
+    common.add_argument('--seller-size', type=int, default=100, help='max reviews per seller-risk request')
+    common.add_argument('--loop-size', type=int, default=10, help='reviews per node-loop operation')
+    common.add_argument('--timeout', type=float, default=60, help='per-request timeout in seconds')
+    common.add_argument('--rss-interval', type=float, default=1.0)
+    common.add_argument('--seed', type=int, default=0)
+    common.add_argument('--output', help='write the JSON report here')
+
+    run_parser = subparsers.add_parser('run', parents=[common], help='Load a server that is already running')
+    run_parser.add_argument('--url', default='http://localhost:5001')
+    run_parser.add_argument('--server-pid', type=int, help='sample RSS of this process tree')
+
+    compare_parser = subparsers.add_parser('compare', parents=[common], help='Start and compare server configurations')
+    compare_parser.add_argument('--configs', nargs='+', choices=list(SERVER_CONFIGS), default=list(SERVER_CONFIGS))
+    compare_parser.add_argument('--port', type=int, default=5055)
+    compare_parser.add_argument('--startup-timeout', type=float, default=300)
+    compare_parser.add_argument('--log-dir', default='./loadtest_logs')
+    compare_parser.add_argument('--keep-state', action='store_true',
+                                help="keep each configuration's temporary state directory")
+
+    args = parser.parse_args()
+    workload = Workload(
+        load_reviews(args.reviews, args.generate), args.batch_size, args.seller_size, args.loop_size
+    )
+
+    report = command_run(args, workload) if args.command == 'run' else command_compare(args, workload)
+    report['parameters'] = {
+        'mix': args.mix, 'rps': args.rps, 'concurrency': args.concurrency, 'duration': args.duration,
+        'batch_size': args.batch_size, 'seller_size': args.seller_size, 'loop_size': args.loop_size
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
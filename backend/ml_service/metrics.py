@@ -0,0 +1,11 @@
+"""
+Latency summaries shared by the scheduler, shadow reports and load tests.
+"""
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values, or None when empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
@@ -0,0 +1,137 @@
+"""
+On-demand statistical profiler for every worker of this service.
+
+GET /debug/profile?seconds=N samples the Python stacks of all threads
+(sys._current_frames) every PROFILE_INTERVAL_MS for N seconds and returns
+them as collapsed stacks ("thread;outer;...;inner count" per line), the
+input format of flamegraph.pl, speedscope and most flame graph viewers.
+
+Gunicorn workers are separate processes and a request only reaches one of
+them, so workers coordinate through a shared directory: the worker serving
+the request drops a trigger file there, every worker's watcher thread picks
+it up and writes its own samples next to it, and the serving worker merges
+whatever arrived once the window (plus a short grace period) has passed.
+
+Environment:
+    PROFILE_DIR           shared trigger/output directory (default <tmp>/fake-review-profiles)
+    PROFILE_INTERVAL_MS   sampling interval (default 10)
+    PROFILE_MAX_SECONDS   longest allowed profile (default 60)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+GRACE_SECONDS = 2.0
+
+
+def _frame_label(code):
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(';', ':')
+
+
+def sample_stacks(seconds, interval, exclude=()):
+    """Collapsed stack counts of every thread in this process"""
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in exclude or ident == threading.get_ident():
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, str(ident)).replace(';', ':'))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+class ProfileCoordinator:
+    """Cross-worker profiling through trigger files in a shared directory"""
+
+    def __init__(self, directory=None, interval_ms=None, poll_seconds=0.5):
+        self.directory = directory or os.environ.get(
+            'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'fake-review-profiles')
+        )
+        self.interval = (interval_ms or float(os.environ.get('PROFILE_INTERVAL_MS', 10))) / 1000
+        self.max_seconds = float(os.environ.get('PROFILE_MAX_SECONDS', 60))
+        self.poll_seconds = poll_seconds
+        self._seen = set()
+        self._watcher = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def start(self):
+        self._watcher = threading.Thread(target=self._watch, name='profile-watcher', daemon=True)
+        self._watcher.start()
+
+    def request(self, seconds):
+        """Ask every worker to profile for `seconds`; returns the profile id"""
+        profile_id = uuid.uuid4().hex
+        path = os.path.join(self.directory, f"{profile_id}.trigger")
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'seconds': seconds, 'created': time.time()}, f)
+        os.replace(path + '.tmp', path)
+        return profile_id
+
+    def collect(self, profile_id, seconds):
+        """Wait for the window to pass and merge every worker's samples"""
+        time.sleep(seconds + GRACE_SECONDS)
+        merged = Counter()
+        workers = []
+        for name in os.listdir(self.directory):
+            if not (name.startswith(profile_id + '.') and name.endswith('.folded')):
+                continue
+            path = os.path.join(self.directory, name)
+            workers.append(name.split('.')[1])
+            with open(path) as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack:
+                        merged[stack] += int(count)
+            os.remove(path)
+        trigger = os.path.join(self.directory, f"{profile_id}.trigger")
+        if os.path.exists(trigger):
+            os.remove(trigger)
+        collapsed = '\n'.join(f"{stack} {count}" for stack, count in merged.most_common())
+        return collapsed, workers
+
+    def _watch(self):
+        while True:
+            try:
+                self._check_triggers()
+            except Exception as e:
+                print(f"Error checking profile triggers: {e}")
+            time.sleep(self.poll_seconds)
+
+    def _check_triggers(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith('.trigger'):
+                continue
+            profile_id = name[:-len('.trigger')]
+            if profile_id in self._seen:
+                continue
+            self._seen.add(profile_id)
+            with open(os.path.join(self.directory, name)) as f:
+                trigger = json.load(f)
+            remaining = trigger['created'] + trigger['seconds'] - time.time()
+            if remaining <= 0:
+                continue
+            threading.Thread(
+                target=self._profile, args=(profile_id, remaining), name='profile-sampler', daemon=True
+            ).start()
+
+    def _profile(self, profile_id, seconds):
+        counts = sample_stacks(seconds, self.interval, exclude={self._watcher.ident})
+        path = os.path.join(self.directory, f"{profile_id}.{os.getpid()}.folded")
+        with open(path + '.tmp', 'w') as f:
+            for stack, count in counts.items():
+                f.write(f"{stack} {count}\n")
+        os.replace(path + '.tmp', path)
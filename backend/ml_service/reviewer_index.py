@@ -0,0 +1,360 @@
+"""
+Per-reviewer aggregates for reviewer credibility.
+
+ReviewerIndex accumulates, for every reviewerId seen by the detector, the
+number of reviews and verified purchases, fake-review hits, first/last
+review time and an exponentially weighted gap between reviews (velocity).
+Lookups and updates are O(1).
+
+Storage is array-backed so it scales to tens of millions of reviewers:
+reviewer IDs are hashed to 64 bits and kept in an open-addressing table
+(HashIndex) that maps to a row in fixed-width NumPy columns, about 60 bytes
+per reviewer in total. The index is saved to and loaded from a single .npz
+file.
+
+A review is counted once per (reviewerId, reviewId): the hashes of scored
+pairs are kept in a second HashIndex (about 24 bytes per review), so job
+resumes, seller-risk re-scoring and client retries do not inflate the
+counts. Reviews without a reviewId cannot be recognised and always count.
+Only positive gaps between known review dates feed the velocity; a missing
+or unparseable reviewDate, or two reviews on the same date, say nothing
+about how fast the reviewer posts.
+
+Every server process keeps its own index plus a log of the reviews it
+recorded since it last saved. save() replays that log onto the file under
+an exclusive flock on <path>.lock, skipping reviews whose (reviewerId,
+reviewId) pair the file already has, so a retry that another worker
+scored is not counted twice and workers sharing one REVIEWER_INDEX_PATH do
+not overwrite each other's history. The process then adopts the merged
+file, so it also scores with what the other workers recorded; sync() does
+the same every REVIEWER_SYNC_SECONDS. Between syncs a worker only sees its
+own reviews plus the state of the file at its last sync.
+
+Environment:
+    REVIEWER_INDEX_PATH     .npz file (default ./ml_models/reviewer_index.npz)
+    REVIEWER_SYNC_SECONDS   interval between syncs with the file (default 60, 0 disables)
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from shared_files import update_file
+
+SECONDS_PER_DAY = 86400.0
+
+# Weight of the newest gap in the exponentially weighted review gap
+VELOCITY_ALPHA = 0.3
+
+
+def hash_key(key):
+    """Stable 64-bit hash of a string key; 0 is reserved for empty slots"""
+    value = int.from_bytes(hashlib.blake2b(str(key).encode('utf-8'), digest_size=8).digest(), 'little')
+    return value or 1
+
+
+class HashIndex:
+    """Open-addressing hash table from 64-bit key hashes to row numbers"""
+
+    def __init__(self, capacity=1024):
+        capacity = 1 << max(4, (capacity - 1).bit_length())
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.rows = np.full(capacity, -1, dtype=np.int32)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _slot(self, key_hash):
+        mask = len(self.keys) - 1
+        slot = key_hash & mask
+        while True:
+            stored = int(self.keys[slot])
+            if stored == key_hash or stored == 0:
+                return slot
+            slot = (slot + 1) & mask
+
+    def get(self, key_hash):
+        slot = self._slot(key_hash)
+        return int(self.rows[slot]) if int(self.keys[slot]) == key_hash else -1
+
+    def insert(self, key_hash, row):
+        if (self.size + 1) * 2 > len(self.keys):
+            self._grow(self.size + 1)
+        slot = self._slot(key_hash)
+        if int(self.keys[slot]) == 0:
+            self.size += 1
+        self.keys[slot] = key_hash
+        self.rows[slot] = row
+
+    def _place(self, key_hashes, rows):
+        # Linear probing for many keys at once: each round, the first key
+        # aimed at an empty slot takes it and the rest move one slot on
+        mask = np.uint64(len(self.keys) - 1)
+        slots = key_hashes & mask
+        while len(key_hashes):
+            _, first = np.unique(slots, return_index=True)
+            wins = np.zeros(len(slots), dtype=bool)
+            wins[first] = True
+            wins &= self.keys[slots] == 0
+            self.keys[slots[wins]] = key_hashes[wins]
+            self.rows[slots[wins]] = rows[wins]
+            key_hashes, rows = key_hashes[~wins], rows[~wins]
+            slots = (slots[~wins] + np.uint64(1)) & mask
+
+    def _grow(self, min_size):
+        occupied = self.keys != 0
+        old_keys, old_rows = self.keys[occupied], self.rows[occupied]
+        capacity = len(self.keys)
+        while min_size * 2 > capacity:
+            capacity *= 2
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.rows = np.full(capacity, -1, dtype=np.int32)
+        self._place(old_keys, old_rows)
+
+
+COLUMNS = {
+    'review_count': np.uint32,
+    'verified_purchases': np.uint32,
+    'fake_hits': np.uint32,
+    'gap_samples': np.uint32,
+    'first_seen': np.uint32,
+    'last_seen': np.uint32,
+    'gap_ewma': np.float32,
+    'account_age_days': np.float32
+}
+
+def _account_age(review):
+    """accountAgeDays as a float, or None when missing or not a number"""
+    try:
+        value = float(review.get('accountAgeDays'))
+    except (TypeError, ValueError):
+        return None
+    return value if np.isfinite(value) and value >= 0 else None
+
+
+def _review_timestamp(review):
+    """Review time in epoch seconds, or None when unknown"""
+    value = review.get('reviewDate')
+    if value:
+        try:
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return None
+
+
+class ReviewerIndex:
+    """O(1) reviewer aggregates backed by NumPy columns"""
+
+    def __init__(self, capacity=1024):
+        self.index = HashIndex(capacity)
+        self.seen = HashIndex(capacity)
+        self.row_keys = np.zeros(capacity, dtype=np.uint64)
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.columns['account_age_days'][:] = -1
+        self.size = 0
+        # Reviews recorded since the last save, replayed onto the file by save()
+        self.pending = []
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, size):
+        capacity = len(self.row_keys)
+        if size <= capacity:
+            return
+        while size > capacity:
+            capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            if name == 'account_age_days':
+                grown[:] = -1
+            grown[:len(column)] = column
+            self.columns[name] = grown
+        grown = np.zeros(capacity, dtype=np.uint64)
+        grown[:len(self.row_keys)] = self.row_keys
+        self.row_keys = grown
+
+    def _row_for(self, key_hash):
+        row = self.index.get(key_hash)
+        if row >= 0:
+            return row, False
+        self._reserve(self.size + 1)
+        row = self.size
+        self.size += 1
+        self.row_keys[row] = key_hash
+        self.index.insert(key_hash, row)
+        return row, True
+
+    def record(self, reviewer_id, review, is_fake):
+        """Add one scored review and return the reviewer's updated stats"""
+        review_id = review.get('reviewId')
+        event = (
+            hash_key(reviewer_id),
+            hash_key(f"{reviewer_id}\x1f{review_id}") if review_id is not None else None,
+            _review_timestamp(review),
+            time.time(),
+            bool(review.get('verifiedPurchase')),
+            bool(is_fake),
+            _account_age(review)
+        )
+        with self._lock:
+            row, applied = self._apply(event)
+            if applied:
+                self.pending.append(event)
+            return self._stats(row)
+
+    def _apply(self, event):
+        """Add one recorded review (caller holds the lock); returns (row, applied)"""
+        key_hash, pair_hash, timestamp, recorded_at, verified, is_fake, account_age = event
+        if pair_hash is not None:
+            row = self.index.get(key_hash)
+            if row >= 0 and self.seen.get(pair_hash) >= 0:
+                # Already counted: a retry, resume or re-score of the same review
+                return row, False
+            self.seen.insert(pair_hash, 0)
+
+        row, created = self._row_for(key_hash)
+        c = self.columns
+        if created:
+            c['first_seen'][row] = timestamp if timestamp is not None else recorded_at
+        elif timestamp is not None:
+            c['first_seen'][row] = min(float(c['first_seen'][row]), timestamp)
+        if timestamp is not None:
+            last_seen = float(c['last_seen'][row])
+            gap = abs(timestamp - last_seen)
+            if last_seen > 0 and gap > 0:
+                previous = float(c['gap_ewma'][row])
+                c['gap_ewma'][row] = gap if c['gap_samples'][row] == 0 else (
+                    VELOCITY_ALPHA * gap + (1 - VELOCITY_ALPHA) * previous
+                )
+                c['gap_samples'][row] += 1
+            c['last_seen'][row] = max(last_seen, timestamp)
+        c['review_count'][row] += 1
+        if verified:
+            c['verified_purchases'][row] += 1
+        if is_fake:
+            c['fake_hits'][row] += 1
+        if account_age is not None:
+            c['account_age_days'][row] = account_age
+        return row, True
+
+    def lookup(self, reviewer_id):
+        """Stats for a reviewer, or None if never seen"""
+        with self._lock:
+            row = self.index.get(hash_key(reviewer_id))
+            return self._stats(row) if row >= 0 else None
+
+    def _stats(self, row):
+        c = self.columns
+        account_age = float(c['account_age_days'][row])
+        if account_age < 0:
+            # Unknown account age: fall back to how long we have seen the reviewer
+            account_age = max(0.0, (time.time() - float(c['first_seen'][row])) / SECONDS_PER_DAY)
+        gap_days = float(c['gap_ewma'][row]) / SECONDS_PER_DAY
+        return {
+            'reviewCount': int(c['review_count'][row]),
+            'verifiedPurchases': int(c['verified_purchases'][row]),
+            'fakeReviewsDetected': int(c['fake_hits'][row]),
+            'accountAgeDays': account_age,
+            # Reviews per day from the weighted gap, capped at one per minute
+            'reviewsPerDay': 1.0 / max(gap_days, 1.0 / 1440) if c['gap_samples'][row] else 0.0
+        }
+
+    def save(self, path):
+        """Replay the reviews recorded since the last save onto path, then adopt the file"""
+        with self._save_lock:
+            with self._lock:
+                events, self.pending = self.pending, []
+            def merge(existing_path):
+                on_disk = ReviewerIndex.load(existing_path) if existing_path else ReviewerIndex()
+                for event in events:
+                    on_disk._apply(event)
+                return on_disk
+
+            try:
+                # Other workers save into the same file
+                on_disk = update_file(path, merge, ReviewerIndex._write, tmp_suffix='.tmp.npz')
+            except Exception:
+                with self._lock:
+                    self.pending = events + self.pending
+                raise
+
+            with self._lock:
+                # Reviews recorded while the file was merged stay pending for the next save
+                for event in self.pending:
+                    on_disk._apply(event)
+                self.index, self.seen = on_disk.index, on_disk.seen
+                self.row_keys, self.columns, self.size = on_disk.row_keys, on_disk.columns, on_disk.size
+
+    def sync(self, path):
+        """Save, which also takes in what other workers saved"""
+        self.save(path)
+
+    def start_syncing(self, path, interval_seconds=None):
+        """sync() every interval_seconds from a daemon thread"""
+        if interval_seconds is None:
+            interval_seconds = float(os.environ.get('REVIEWER_SYNC_SECONDS', 60))
+        if interval_seconds <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.sync(path)
+                except Exception as e:
+                    print(f"Error syncing reviewer index: {e}")
+
+        threading.Thread(target=run, name='reviewer-index-sync', daemon=True).start()
+
+    def _write(self, path):
+        with self._lock:
+            arrays = {name: column[:self.size] for name, column in self.columns.items()}
+            arrays['row_keys'] = self.row_keys[:self.size]
+            arrays['hash_keys'] = self.index.keys
+            arrays['hash_rows'] = self.index.rows
+            arrays['seen_keys'] = self.seen.keys
+            np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            size = len(data['review_count'])
+            reviewer_index = cls(capacity=max(1024, size))
+            for name in COLUMNS:
+                if name in data:
+                    reviewer_index.columns[name][:size] = data[name]
+            reviewer_index.index.keys = data['hash_keys'].copy()
+            reviewer_index.index.rows = data['hash_rows'].copy()
+            reviewer_index.index.size = int(np.count_nonzero(reviewer_index.index.keys))
+            if 'row_keys' in data:
+                reviewer_index.row_keys[:size] = data['row_keys']
+            else:
+                occupied = reviewer_index.index.keys != 0
+                reviewer_index.row_keys[reviewer_index.index.rows[occupied]] = reviewer_index.index.keys[occupied]
+            if 'gap_samples' not in data:
+                # Older files: every review after the first produced a gap
+                reviewer_index.columns['gap_samples'][:size] = np.maximum(data['review_count'].astype(np.int64) - 1, 0)
+            if 'seen_keys' in data:
+                reviewer_index.seen.keys = data['seen_keys'].copy()
+                reviewer_index.seen.rows = np.where(reviewer_index.seen.keys != 0, 0, -1).astype(np.int32)
+                reviewer_index.seen.size = int(np.count_nonzero(reviewer_index.seen.keys))
+            reviewer_index.size = size
+        return reviewer_index
+
+    @classmethod
+    def load_or_create(cls, path):
+        if path and os.path.exists(path):
+            try:
+                return cls.load(path)
+            except Exception as e:
+                print(f"Error loading reviewer index from {path}: {e}")
+        return cls()
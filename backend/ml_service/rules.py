@@ -0,0 +1,165 @@
+"""
+Rule-based score enhancement compiled from a declarative table.
+
+The thresholds and boosts that adjust the model confidences (and the
+review authenticity score) live in enhancement_rules.json:
+
+    {"scores": {"bot_activity": {"max": 1.0, "threshold": 0.35, "rules": [
+        {"when": [["exclamation_count", ">=", 3]], "add": 0.15},
+        {"when": [["rating", "==", 5], ["total_words", "<", 10]], "add": 0.1}
+    ]}}}
+
+Every score starts from `base` (or the model confidence passed in), adds
+`add` for each rule whose `when` conditions all hold (multiplied by the
+feature named in `times`, if any) and is clipped to `min`/`max`. Rules are
+compiled into NumPy operations, so a whole batch costs one array pass per
+rule. The file is re-read when it changes, so thresholds can be tuned
+without a deploy. Set ENHANCEMENT_RULES_PATH to use another file.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from text_normalization import normalize
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'enhancement_rules.json')
+
+OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+    'in': np.isin
+}
+
+# Text analysis features available to rules, with their defaults
+TEXT_FEATURES = {
+    'repetition_score': 0,
+    'suspicious_phrase_count': 0,
+    'exclamation_count': 0,
+    'generic_word_count': 0,
+    'repeated_starters': 0,
+    'total_words': 0,
+    'unique_words': 0
+}
+
+
+def to_number(value, default=np.nan):
+    """float(value), or default when it is not a number ('five', 'N/A', [5], None)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def build_features(reviews, text_analyses):
+    """Collect per-review rule inputs into one array per feature"""
+    features = {
+        name: np.array([analysis.get(name, default) for analysis in text_analyses], dtype=np.float64)
+        for name, default in TEXT_FEATURES.items()
+    }
+    # A rating that is not a number matches no rating rule, like "not 5" did before
+    features['rating'] = np.array([to_number(review.get('rating', 5)) for review in reviews], dtype=np.float64)
+    features['review_length'] = np.array(
+        [len(normalize(review.get('reviewText', '')).words) for review in reviews], dtype=np.float64
+    )
+    return features
+
+
+class CompiledScore:
+    """One score's rule list compiled into array operations"""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.base = spec.get('base')
+        self.min = spec.get('min')
+        self.max = spec.get('max')
+        self.threshold = spec.get('threshold')
+        self.rules = []
+        for rule in spec.get('rules', []):
+            conditions = []
+            for feature, op, value in rule.get('when', []):
+                if op not in OPERATORS:
+                    raise ValueError(f"Unknown operator {op!r} in {name} rules")
+                conditions.append((feature, OPERATORS[op], np.asarray(value)))
+            self.rules.append((conditions, float(rule['add']), rule.get('times')))
+
+    def evaluate(self, features, base=None):
+        if base is None:
+            base = self.base if self.base is not None else 0.0
+        size = len(next(iter(features.values())))
+        score = np.broadcast_to(np.asarray(base, dtype=np.float64), (size,)).copy()
+
+        for conditions, add, times in self.rules:
+            contribution = np.full(size, add)
+            if times is not None:
+                contribution *= features[times]
+            if conditions:
+                mask = np.logical_and.reduce([op(features[feature], value) for feature, op, value in conditions])
+                contribution *= mask
+            score += contribution
+
+        if self.min is not None or self.max is not None:
+            score = np.clip(score, self.min, self.max)
+        return score
+
+
+class RuleEngine:
+    """Loads the rule table, compiles it and reloads it when the file changes"""
+
+    def __init__(self, path=None, check_interval=5.0):
+        self.path = path or os.environ.get('ENHANCEMENT_RULES_PATH', DEFAULT_RULES_PATH)
+        self.check_interval = check_interval
+        self.scores = {}
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Compile the rule file; keep the previous table if it is invalid"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r') as f:
+                config = json.load(f)
+            scores = {name: CompiledScore(name, spec) for name, spec in config.get('scores', {}).items()}
+            self.scores = scores
+            self._mtime = mtime
+            return True
+        except Exception as e:
+            print(f"Error loading enhancement rules from {self.path}: {e}")
+            return False
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    self.reload()
+            except OSError:
+                pass
+
+    def threshold(self, name, default):
+        score = self.scores.get(name)
+        return score.threshold if score is not None and score.threshold is not None else default
+
+    def evaluate(self, name, features, base=None):
+        """Evaluate score `name` for a batch; `base` overrides the configured base"""
+        self.maybe_reload()
+        score = self.scores.get(name)
+        if score is None:
+            if base is None:
+                raise KeyError(f"No rules configured for {name}")
+            return np.asarray(base, dtype=np.float64)
+        return score.evaluate(features, base)
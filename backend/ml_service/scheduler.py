@@ -0,0 +1,251 @@
+"""
+Priority scheduling between interactive and bulk scoring.
+
+Every scoring request is cut into micro-batches that wait in one priority
+queue, ordered by (priority class, deadline, arrival). A small pool of
+scheduler threads pulls micro-batches and scores them with
+FakeReviewDetector.process_reviews, so:
+
+* a multi-thousand review upload never holds a worker for minutes; between
+  two of its micro-batches any waiting interactive request goes first,
+* single interactive reviews arriving together are coalesced into one
+  micro-batch,
+* within a class the earliest deadline runs first, and a request whose
+  deadline has passed is dropped instead of burning CPU,
+* when interactive micro-batches wait too long, interactive scoring steps
+  down to cheaper degradation levels (see degradation.py); bulk work always
+  scores at full.
+
+Environment:
+    SCHEDULER_WORKERS            scoring threads (default 2)
+    SCHEDULER_MICRO_BATCH        reviews per micro-batch (default 32)
+    SCHEDULER_INTERACTIVE_MS     default interactive deadline (default 10000)
+    SCHEDULER_BULK_MS            default bulk deadline (default none)
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+import tracing
+from degradation import DegradationController
+from metrics import percentile
+
+PRIORITY_CLASSES = {
+    'interactive': 0,
+    'bulk': 1
+}
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before it could be scored"""
+
+
+def _default_deadline_ms(priority):
+    value = os.environ.get(f"SCHEDULER_{priority.upper()}_MS")
+    if value is None:
+        return 10000 if priority == 'interactive' else None
+    return float(value) or None
+
+
+class ScoringRequest:
+    """One submitted list of reviews; completes when all its chunks are done"""
+
+    def __init__(self, reviews, priority, deadline):
+        self.reviews = reviews
+        self.priority = priority
+        self.deadline = deadline
+        self.results = [None] * len(reviews)
+        self.error = None
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.traces = tracing.active()
+        self.pending_chunks = 0
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until scored and return the results, or raise the request error"""
+        if not self.done.wait(timeout):
+            raise DeadlineExceeded('Timed out waiting for scoring')
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+class ClassMetrics:
+    """Latency samples and counters for one priority class"""
+
+    def __init__(self, window=2048):
+        self.completed = 0
+        self.reviews = 0
+        self.deadline_misses = 0
+        self.queue_wait_ms = deque(maxlen=window)
+        self.latency_ms = deque(maxlen=window)
+
+    def snapshot(self):
+        latency = list(self.latency_ms)
+        queue_wait = list(self.queue_wait_ms)
+        return {
+            'completed': self.completed,
+            'reviews': self.reviews,
+            'deadline_misses': self.deadline_misses,
+            'latency_ms': {p: percentile(latency, p) for p in (50, 95, 99)},
+            'queue_wait_ms': {p: percentile(queue_wait, p) for p in (50, 95, 99)}
+        }
+
+
+class InferenceScheduler:
+    """Priority queue of micro-batches in front of the detector"""
+
+    def __init__(self, detector, workers=None, micro_batch_size=None, shadow=None):
+        self.detector = detector
+        self.shadow = shadow
+        self.micro_batch_size = micro_batch_size or int(os.environ.get('SCHEDULER_MICRO_BATCH', 32))
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._metrics = {name: ClassMetrics() for name in PRIORITY_CLASSES}
+        self._metrics_lock = threading.Lock()
+        self.degradation = DegradationController()
+
+        workers = workers or int(os.environ.get('SCHEDULER_WORKERS', 2))
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"scheduler-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, reviews, priority='interactive', deadline_ms=None):
+        """Queue reviews for scoring and return a ScoringRequest to wait on"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        if deadline_ms is None:
+            deadline_ms = _default_deadline_ms(priority)
+        deadline = time.monotonic() + deadline_ms / 1000 if deadline_ms else None
+
+        scoring_request = ScoringRequest(reviews, priority, deadline)
+        if not reviews:
+            scoring_request.done.set()
+            return scoring_request
+
+        chunks = range(0, len(reviews), self.micro_batch_size)
+        scoring_request.pending_chunks = len(chunks)
+        rank = PRIORITY_CLASSES[priority]
+        deadline_key = deadline if deadline is not None else float('inf')
+        with self._condition:
+            for start in chunks:
+                end = min(start + self.micro_batch_size, len(reviews))
+                heapq.heappush(self._queue, (rank, deadline_key, next(self._sequence), scoring_request, start, end))
+            self._condition.notify(len(chunks))
+        return scoring_request
+
+    def run(self, reviews, priority='interactive', deadline_ms=None):
+        """Submit and block until the results are ready"""
+        return self.submit(reviews, priority, deadline_ms).wait()
+
+    def queue_depth(self):
+        with self._condition:
+            return len(self._queue)
+
+    def metrics(self):
+        with self._metrics_lock:
+            classes = {name: metrics.snapshot() for name, metrics in self._metrics.items()}
+        return {
+            'queue_depth': self.queue_depth(),
+            'micro_batch_size': self.micro_batch_size,
+            'workers': len(self._threads),
+            'classes': classes,
+            'degradation': self.degradation.snapshot()
+        }
+
+    def _next_micro_batch(self):
+        """Pop the most urgent chunk, coalescing same-class chunks up to the batch size"""
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            batch = [heapq.heappop(self._queue)]
+            size = batch[0][5] - batch[0][4]
+            while self._queue and self._queue[0][0] == batch[0][0]:
+                next_size = self._queue[0][5] - self._queue[0][4]
+                if size + next_size > self.micro_batch_size:
+                    break
+                batch.append(heapq.heappop(self._queue))
+                size += next_size
+            return batch
+
+    def _worker(self):
+        while True:
+            batch = self._next_micro_batch()
+            now = time.monotonic()
+
+            live = []
+            for item in batch:
+                scoring_request = item[3]
+                if scoring_request.error is not None:
+                    self._finish_chunk(scoring_request)
+                elif scoring_request.deadline is not None and now > scoring_request.deadline:
+                    scoring_request.error = DeadlineExceeded('Deadline passed while queued')
+                    self._finish_chunk(scoring_request)
+                else:
+                    if scoring_request.started_at is None:
+                        scoring_request.started_at = now
+                        for trace in scoring_request.traces:
+                            trace.add('queue', scoring_request.enqueued_at, now)
+                    live.append(item)
+
+            if not live:
+                continue
+
+            reviews = []
+            traces = []
+            for _, _, _, scoring_request, start, end in live:
+                reviews.extend(scoring_request.reviews[start:end])
+                traces.extend(trace for trace in scoring_request.traces if trace not in traces)
+            # Micro-batches only coalesce chunks of one class
+            level = 'full'
+            if live[0][3].priority == 'interactive':
+                oldest_wait_ms = max(now - item[3].enqueued_at for item in live) * 1000
+                level = self.degradation.observe(oldest_wait_ms)
+            try:
+                # Spans of a shared micro-batch go to every traced request in it
+                started = time.perf_counter()
+                with tracing.activate(traces), tracing.span('score_batch', reviews=len(reviews), level=level):
+                    results = self.detector.process_reviews(reviews, level)
+                if self.shadow is not None:
+                    self.shadow.offer(reviews, results, (time.perf_counter() - started) * 1000)
+            except Exception as e:
+                print(f"Error scoring micro-batch: {e}")
+                results = None
+
+            offset = 0
+            for _, _, _, scoring_request, start, end in live:
+                if results is None:
+                    scoring_request.error = RuntimeError('Scoring failed')
+                else:
+                    scoring_request.results[start:end] = results[offset:offset + end - start]
+                offset += end - start
+                self._finish_chunk(scoring_request)
+
+    def _finish_chunk(self, scoring_request):
+        with self._condition:
+            scoring_request.pending_chunks -= 1
+            finished = scoring_request.pending_chunks == 0
+        if not finished:
+            return
+
+        now = time.monotonic()
+        with self._metrics_lock:
+            metrics = self._metrics[scoring_request.priority]
+            if isinstance(scoring_request.error, DeadlineExceeded):
+                metrics.deadline_misses += 1
+            else:
+                metrics.completed += 1
+                metrics.reviews += len(scoring_request.reviews)
+                metrics.latency_ms.append((now - scoring_request.enqueued_at) * 1000)
+                started = scoring_request.started_at or now
+                metrics.queue_wait_ms.append((started - scoring_request.enqueued_at) * 1000)
+        scoring_request.done.set()
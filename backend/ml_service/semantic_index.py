@@ -0,0 +1,424 @@
+"""
+Approximate nearest-neighbour search over review embeddings.
+
+The copy-paste head's LSTM output (see InferenceSession) is a dense vector
+per review. Paraphrased copies land close together in that space even when
+the words differ, so each scored review is searched against the other
+reviews of the same seller (or product) and close matches are reported as
+semanticDuplicates.
+
+Vectors are L2-normalised and compared by cosine similarity. The index is
+partitioned by seller or product, which keeps every search local:
+
+* small partitions (below SEMANTIC_IVF_THRESHOLD vectors) are searched
+  exhaustively with one matrix product,
+* larger ones get an IVF index: spherical k-means over a sample picks
+  sqrt(n) centroids, every vector is filed under its nearest centroid, and
+  a query only scans the SEMANTIC_NPROBE closest lists. Vectors added after
+  the last build sit in an exhaustively searched tail; the partition is
+  rebuilt once the tail outgrows a fifth of the indexed vectors.
+
+Builds run outside the partition lock, so scoring keeps going while a large
+partition is re-clustered. Partition keys and review ids are stored as
+strings, so integer sellerIds and reviewIds match after a reload.
+
+The file is an append-only log of segments, each holding the vectors one
+process indexed since its previous write. Every server process keeps its
+own in-memory index over the same file and remembers how far it has read.
+sync() runs under an exclusive flock on <path>.lock: it reads the segments
+other workers appended since then, appends one segment with this
+process's new vectors and moves its read position past both. A sync
+therefore costs only what changed, whatever the size of the index; a full
+read happens once, at startup. Workers sync every SEMANTIC_SYNC_SECONDS,
+so a paraphrase scored by one worker is found by the others from the next
+sync on. A review indexed by two workers is stored twice in the file and
+deduplicated by review id on load.
+
+Environment:
+    SEMANTIC_INDEX_PATH             segment log (default ./ml_models/semantic_index.bin)
+    SEMANTIC_SYNC_SECONDS           interval between merges with the file (default 60, 0 disables)
+    SEMANTIC_PARTITION              'seller' or 'product' (default seller)
+    SEMANTIC_DUPLICATE_THRESHOLD    minimum cosine similarity (default 0.92)
+    SEMANTIC_TOP_K                  duplicates reported per review (default 5)
+    SEMANTIC_IVF_THRESHOLD          partition size that switches to IVF (default 4096)
+    SEMANTIC_NPROBE                 IVF lists scanned per query (default 8)
+"""
+
+import io
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from shared_files import locked
+
+PARTITION_FIELDS = {
+    'seller': 'sellerId',
+    'product': 'productId'
+}
+
+# Rebuild IVF once this share of the partition is in the unindexed tail
+REBUILD_FRACTION = 0.2
+
+# Start of every index file; each segment follows as <length><npz payload>
+FILE_MAGIC = b'SEMIDX1\n'
+SEGMENT_HEADER = struct.Struct('<Q')
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(data, clusters, iterations=10, sample_per_cluster=40, seed=0):
+    """Centroids of normalised data; fitted on a sample for speed"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(data), clusters * sample_per_cluster)
+    sample = data[rng.choice(len(data), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=clusters)
+        empty = counts == 0
+        # Re-seed empty clusters from random sample points
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign(data, centroids, chunk_size=65536):
+    """Nearest centroid for every row, in chunks to bound memory"""
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk_size):
+        labels[start:start + chunk_size] = np.argmax(data[start:start + chunk_size] @ centroids.T, axis=1)
+    return labels
+
+
+class IVFLists:
+    """Inverted lists over the first `size` vectors of a partition"""
+
+    def __init__(self, vectors):
+        self.size = len(vectors)
+        clusters = max(1, int(np.sqrt(self.size)))
+        self.centroids = spherical_kmeans(vectors, clusters)
+        labels = assign(vectors, self.centroids)
+        self.order = np.argsort(labels, kind='stable').astype(np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=clusters))])
+
+    def candidates(self, query, nprobe):
+        probes = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate([self.order[self.offsets[p]:self.offsets[p + 1]] for p in probes])
+
+
+class Partition:
+    """Vectors and review ids of one seller or product"""
+
+    def __init__(self, dim, capacity=16):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = []
+        self.rows = {}
+        # (start, end) row ranges indexed here and not yet written to the file
+        self.unsynced = []
+        self.ivf = None
+        self.building = False
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        return len(self.ids)
+
+    def add(self, vectors, review_ids, local=True):
+        """Append vectors for unseen review ids; returns their row numbers.
+
+        local=False marks vectors read from the file, which sync() must not
+        write back.
+        """
+        with self.lock:
+            start = self.size
+            rows, new = [], []
+            for i, review_id in enumerate(review_ids):
+                row = self.rows.get(review_id)
+                if row is None:
+                    row = self.rows[review_id] = start + len(new)
+                    new.append(i)
+                rows.append(row)
+            if not new:
+                return rows
+
+            end = start + len(new)
+            if end > len(self.vectors):
+                capacity = len(self.vectors)
+                while end > capacity:
+                    capacity *= 2
+                grown = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+                grown[:start] = self.vectors[:start]
+                self.vectors = grown
+            self.vectors[start:end] = np.asarray(vectors)[new]
+            self.ids.extend(review_ids[i] for i in new)
+            if local:
+                self.unsynced.append((start, end))
+            return rows
+
+    def take_unsynced(self):
+        """(ranges, vectors, ids) indexed here since the last call"""
+        with self.lock:
+            ranges, self.unsynced = self.unsynced, []
+            if not ranges:
+                return ranges, None, []
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+            return ranges, self.vectors[rows].copy(), [self.ids[row] for row in rows]
+
+    def restore_unsynced(self, ranges):
+        with self.lock:
+            self.unsynced = ranges + self.unsynced
+
+    def needs_build(self, ivf_threshold):
+        if self.building or self.size < ivf_threshold:
+            return False
+        return self.ivf is None or self.size - self.ivf.size > self.ivf.size * REBUILD_FRACTION
+
+    def build(self):
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+            snapshot = self.vectors[:self.size].copy()
+        try:
+            ivf = IVFLists(snapshot)
+            with self.lock:
+                self.ivf = ivf
+        finally:
+            self.building = False
+
+    def search(self, query, k, threshold, nprobe, exclude_row=-1):
+        """[(review_id, similarity)] of the k closest vectors above threshold"""
+        with self.lock:
+            size = self.size
+            vectors = self.vectors
+            ivf = self.ivf
+            ids = self.ids
+
+        if ivf is not None:
+            rows = np.concatenate([ivf.candidates(query, nprobe), np.arange(ivf.size, size, dtype=np.int32)])
+        else:
+            rows = np.arange(size, dtype=np.int32)
+        if not len(rows):
+            return []
+
+        similarity = vectors[rows] @ query
+        keep = (similarity >= threshold) & (rows != exclude_row)
+        rows, similarity = rows[keep], similarity[keep]
+        if len(rows) > k:
+            top = np.argpartition(-similarity, k)[:k]
+            rows, similarity = rows[top], similarity[top]
+        ranked = np.argsort(-similarity)
+        return [(ids[rows[i]], float(similarity[i])) for i in ranked]
+
+
+class SemanticIndex:
+    """Embedding index partitioned by seller or product"""
+
+    def __init__(self, partition_by=None, threshold=None, top_k=None, ivf_threshold=None, nprobe=None):
+        self.partition_field = PARTITION_FIELDS[partition_by or os.environ.get('SEMANTIC_PARTITION', 'seller')]
+        self.threshold = threshold or float(os.environ.get('SEMANTIC_DUPLICATE_THRESHOLD', 0.92))
+        self.top_k = top_k or int(os.environ.get('SEMANTIC_TOP_K', 5))
+        self.ivf_threshold = ivf_threshold or int(os.environ.get('SEMANTIC_IVF_THRESHOLD', 4096))
+        self.nprobe = nprobe or int(os.environ.get('SEMANTIC_NPROBE', 8))
+        self.partitions = {}
+        # Bytes of the file already read into this index
+        self.file_offset = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def _partition(self, key, dim):
+        with self._lock:
+            partition = self.partitions.get(key)
+            if partition is None:
+                partition = self.partitions[key] = Partition(dim)
+            return partition
+
+    def add_and_search(self, reviews, embeddings):
+        """Index the reviews' embeddings and return near-duplicates per review.
+
+        Rows whose embedding is NaN (not scored by the LSTM) or that have no
+        partition key get an empty list. Reviews in the same batch can match
+        each other.
+        """
+        results = [[] for _ in reviews]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        usable = ~np.isnan(embeddings).any(axis=1) if len(embeddings) else np.zeros(0, dtype=bool)
+
+        groups = {}
+        for row, review in enumerate(reviews):
+            key = review.get(self.partition_field)
+            if key and usable[row]:
+                # Saved files hold string keys; 123 and '123' are one seller
+                groups.setdefault(str(key), []).append(row)
+
+        for key, rows in groups.items():
+            vectors = normalize(embeddings[rows])
+            partition = self._partition(key, vectors.shape[1])
+            stored = [reviews[row].get('reviewId') for row in rows]
+            stored = [str(review_id) if review_id is not None and review_id != '' else None for review_id in stored]
+            indexed = [i for i, review_id in enumerate(stored) if review_id]
+            own_rows = dict(zip(indexed, partition.add(vectors[indexed], [stored[i] for i in indexed])))
+
+            if partition.needs_build(self.ivf_threshold):
+                threading.Thread(target=partition.build, name='semantic-index-build', daemon=True).start()
+
+            for i, row in enumerate(rows):
+                matches = partition.search(vectors[i], self.top_k, self.threshold, self.nprobe, own_rows.get(i, -1))
+                results[row] = [
+                    {'reviewId': review_id, 'similarity': round(similarity, 4)}
+                    for review_id, similarity in matches
+                ]
+        return results
+
+    def stats(self):
+        with self._lock:
+            partitions = list(self.partitions.values())
+        sizes = [partition.size for partition in partitions]
+        return {
+            'partition_by': self.partition_field,
+            'partitions': len(partitions),
+            'vectors': int(sum(sizes)),
+            'largest_partition': max(sizes) if sizes else 0,
+            'ivf_partitions': sum(1 for partition in partitions if partition.ivf is not None)
+        }
+
+    def _add_segment(self, segment, build=True):
+        """Index a segment read from the file (vectors other processes saved)"""
+        offsets, ids, vectors = segment['offsets'], segment['ids'].tolist(), segment['vectors']
+        for i, key in enumerate(segment['keys'].tolist()):
+            start, end = int(offsets[i]), int(offsets[i + 1])
+            if start == end:
+                continue
+            partition = self._partition(key, vectors.shape[1])
+            partition.add(vectors[start:end], ids[start:end], local=False)
+            if build and partition.needs_build(self.ivf_threshold):
+                threading.Thread(target=partition.build, name='semantic-index-build', daemon=True).start()
+
+    def save(self, path):
+        """Append this process's new vectors to the file at path"""
+        self._exchange(path, adopt=False)
+
+    def sync(self, path):
+        """Read what other workers appended, then append this process's new vectors"""
+        self._exchange(path, adopt=True)
+
+    def _exchange(self, path, adopt):
+        with self._save_lock, locked(path):
+            with open(path, 'a+b') as f:
+                if f.tell() == 0:
+                    f.write(FILE_MAGIC)
+                    f.flush()
+                _check_magic(f)
+                # Segments from other workers; keeps the read position past them
+                segments, end = _read_segments(f, self.file_offset)
+                if adopt:
+                    for segment in segments:
+                        self._add_segment(segment)
+
+                with self._lock:
+                    items = list(self.partitions.items())
+                taken = [(key, partition, *partition.take_unsynced()) for key, partition in items]
+                outgoing = [(key, vectors, ids) for key, _, _, vectors, ids in taken if ids]
+                try:
+                    if outgoing:
+                        # A partial segment from a crashed writer is dropped
+                        f.truncate(end)
+                        f.seek(end)
+                        f.write(_encode_segment(outgoing))
+                        f.flush()
+                        end = f.tell()
+                except Exception:
+                    for _, partition, ranges, _, _ in taken:
+                        partition.restore_unsynced(ranges)
+                    raise
+            self.file_offset = end
+
+    def start_syncing(self, path, interval_seconds=None):
+        """sync() every interval_seconds from a daemon thread"""
+        if interval_seconds is None:
+            interval_seconds = float(os.environ.get('SEMANTIC_SYNC_SECONDS', 60))
+        if interval_seconds <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.sync(path)
+                except Exception as e:
+                    print(f"Error syncing semantic index: {e}")
+
+        threading.Thread(target=run, name='semantic-index-sync', daemon=True).start()
+
+    @classmethod
+    def load(cls, path):
+        semantic_index = cls()
+        with open(path, 'rb') as f:
+            _check_magic(f)
+            segments, semantic_index.file_offset = _read_segments(f, len(FILE_MAGIC))
+        for segment in segments:
+            semantic_index._add_segment(segment, build=False)
+        return semantic_index
+
+    @classmethod
+    def load_or_create(cls, path):
+        if path and os.path.exists(path):
+            try:
+                return cls.load(path)
+            except Exception as e:
+                print(f"Error loading semantic index from {path}: {e}")
+        return cls()
+
+
+def _check_magic(f):
+    f.seek(0)
+    if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+        raise ValueError(f"{f.name} is not a semantic index file")
+
+
+def _read_segments(f, offset):
+    """Complete segments from offset on, and the offset after the last one"""
+    offset = max(offset, len(FILE_MAGIC))
+    f.seek(offset)
+    segments = []
+    while True:
+        header = f.read(SEGMENT_HEADER.size)
+        if len(header) < SEGMENT_HEADER.size:
+            return segments, offset
+        (length,) = SEGMENT_HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length:
+            return segments, offset
+        with np.load(io.BytesIO(payload)) as data:
+            segments.append({name: data[name] for name in data.files})
+        offset += SEGMENT_HEADER.size + length
+
+
+def _encode_segment(partitions):
+    """[(key, vectors, ids)] as one length-prefixed npz segment"""
+    keys, offsets, ids, vectors = [], [0], [], []
+    for key, partition_vectors, partition_ids in partitions:
+        keys.append(str(key))
+        ids.extend(partition_ids)
+        vectors.append(partition_vectors)
+        offsets.append(offsets[-1] + len(partition_ids))
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        keys=np.array(keys, dtype=str),
+        offsets=np.array(offsets, dtype=np.int64),
+        ids=np.array(ids, dtype=str),
+        vectors=np.concatenate(vectors)
+    )
+    payload = buffer.getvalue()
+    return SEGMENT_HEADER.pack(len(payload)) + payload
@@ -0,0 +1,98 @@
+"""
+Response encoding for the prediction endpoints.
+
+Formats, picked from the Accept header:
+    application/json                         full payload (default, unchanged)
+    application/x-msgpack                    compact payload as MessagePack
+    application/vnd.fakereview.columnar+json results as one array per field (a single
+                                             review is a one-row result)
+
+The compact formats drop the nested `suspiciousPatterns` object, which only
+repeats the flattened burst/copy-paste/bot fields. Any format can be narrowed
+further with a `fields=` query parameter (comma-separated prediction keys).
+
+orjson and msgpack are used when installed; without orjson the standard
+library encoder is used with compact separators.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+COLUMNAR = 'application/vnd.fakereview.columnar+json'
+
+COMPACT_FORMATS = (MSGPACK, COLUMNAR)
+
+# Nested copy of the flattened *Detected/*Confidence fields
+DUPLICATED_FIELDS = ('suspiciousPatterns',)
+
+
+def available_formats():
+    formats = [JSON, COLUMNAR]
+    if msgpack is not None:
+        formats.insert(1, MSGPACK)
+        formats.append('application/msgpack')
+    return formats
+
+
+def negotiate(accept_mimetypes):
+    """Pick a response format from a werkzeug Accept object; JSON by default"""
+    best = accept_mimetypes.best_match(available_formats(), default=JSON)
+    return MSGPACK if best == 'application/msgpack' else best
+
+
+def parse_fields(value):
+    """Parse a `fields=a,b,c` query value into a tuple, or None for all fields"""
+    if not value:
+        return None
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    return fields or None
+
+
+def project(prediction, fields=None, compact=False):
+    """Return the requested subset of a prediction dict"""
+    if fields is not None:
+        return {key: prediction[key] for key in fields if key in prediction}
+    if compact:
+        return {key: value for key, value in prediction.items() if key not in DUPLICATED_FIELDS}
+    return prediction
+
+
+def to_columnar(rows, fields=None):
+    """Turn [{'reviewId', 'predictions'}] rows into one list per field"""
+    if fields is None:
+        keys = []
+        for row in rows:
+            for key in row['predictions']:
+                if key not in DUPLICATED_FIELDS and key not in keys:
+                    keys.append(key)
+    else:
+        keys = list(fields)
+
+    columns = {'reviewId': [row.get('reviewId') for row in rows]}
+    for key in keys:
+        columns[key] = [row['predictions'].get(key) for row in rows]
+    return {'count': len(rows), 'columns': list(columns), 'data': columns}
+
+
+def dumps_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def encode(payload, mimetype):
+    """Encode a payload for the negotiated mimetype and return the body bytes"""
+    if mimetype == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return dumps_json(payload)
@@ -0,0 +1,318 @@
+"""
+Shadow scoring of a candidate model bundle on live traffic.
+
+When SHADOW_MODELS_DIR points at a second ml_models directory, a candidate
+FakeReviewDetector is loaded from it in a separate process (started as
+`python shadow.py serve`, with reviewer tracking off, so it never touches
+the reviewer index, collusion graph or semantic index). That process lowers
+its own priority before TensorFlow starts, so the niceness covers every
+TensorFlow pool thread, and it runs with SHADOW_TF_THREADS intra/inter-op
+threads. The candidate therefore only gets CPU that the primary's
+inference does not use, and it has no share of the primary's
+InferenceSession concurrency.
+
+After the scheduler scores a micro-batch, a sampled fraction of batches is
+handed to ShadowScorer.offer(), which only does a non-blocking put on a
+bounded queue; when the queue is full the batch is dropped and counted
+rather than slowing the primary path. A feeder thread pickles queued
+batches into the shadow process's stdin. The shadow process scores each
+batch with the candidate and writes per-review disagreements and per-batch
+latency of both bundles to SQLite.
+
+Batches the primary scored at a degraded level are not shadowed, since they
+would disagree by construction. To see what shadowing costs the primary,
+compare the gunicorn-gthread and gunicorn-gthread-shadow configurations of
+loadtest.py.
+
+Usage:
+    python shadow.py report [--db shadow.db] [--hours 24]
+
+Environment:
+    SHADOW_MODELS_DIR     candidate bundle; shadow mode is off when unset
+    SHADOW_SAMPLE_RATE    fraction of micro-batches shadowed (default 0.1)
+    SHADOW_QUEUE_SIZE     batches waiting for the candidate (default 64)
+    SHADOW_DB_PATH        SQLite file (default ./shadow.db)
+    SHADOW_NICE           niceness of the shadow process (default 10)
+    SHADOW_TF_THREADS     TensorFlow intra/inter-op threads in the shadow process (default 1)
+"""
+
+import argparse
+import json
+import os
+import pickle
+import queue
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from metrics import percentile
+
+PATTERNS = ['burst_reviews', 'copy_paste', 'bot_activity']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shadow_batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    batch_size INTEGER NOT NULL,
+    primary_ms REAL NOT NULL,
+    candidate_ms REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shadow_reviews (
+    batch_id INTEGER NOT NULL,
+    review_id TEXT,
+    primary_fake INTEGER NOT NULL,
+    candidate_fake INTEGER NOT NULL,
+    primary_confidence REAL NOT NULL,
+    candidate_confidence REAL NOT NULL,
+    pattern_disagreements TEXT NOT NULL
+);
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def compare(primary, candidate):
+    """Per-review comparison of two prediction dicts"""
+    return {
+        'primary_fake': int(primary['isFake']),
+        'candidate_fake': int(candidate['isFake']),
+        'primary_confidence': float(primary['confidence']),
+        'candidate_confidence': float(candidate['confidence']),
+        'pattern_disagreements': [
+            name for name in PATTERNS
+            if primary['suspiciousPatterns'][name]['detected'] != candidate['suspiciousPatterns'][name]['detected']
+        ]
+    }
+
+
+class ShadowScorer:
+    """Scores sampled micro-batches with a candidate bundle in a low-priority process"""
+
+    def __init__(self, models_dir, sample_rate=None, queue_size=None, db_path=None):
+        self.models_dir = models_dir
+        self.sample_rate = sample_rate if sample_rate is not None else float(
+            os.environ.get('SHADOW_SAMPLE_RATE', 0.1)
+        )
+        self.db_path = db_path or os.environ.get('SHADOW_DB_PATH', './shadow.db')
+        self._queue = queue.Queue(maxsize=queue_size or int(os.environ.get('SHADOW_QUEUE_SIZE', 64)))
+        self._lock = threading.Lock()
+        self.counters = {'offered': 0, 'sampled': 0, 'dropped': 0, 'scored': 0, 'errors': 0}
+
+        tf_threads = os.environ.get('SHADOW_TF_THREADS', '1')
+        env = dict(os.environ, TF_INTRA_OP_THREADS=tf_threads, TF_INTER_OP_THREADS=tf_threads)
+        self._process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'serve', '--models-dir', models_dir,
+             '--db', self.db_path, '--nice', os.environ.get('SHADOW_NICE', '10')],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env
+        )
+        threading.Thread(target=self._feed, name='shadow-feed', daemon=True).start()
+        threading.Thread(target=self._read_outcomes, name='shadow-outcomes', daemon=True).start()
+
+    @classmethod
+    def from_env(cls):
+        """ShadowScorer for SHADOW_MODELS_DIR, or None when shadow mode is off"""
+        models_dir = os.environ.get('SHADOW_MODELS_DIR')
+        if not models_dir:
+            return None
+        scorer = cls(models_dir)
+        print(f"Shadow scoring {models_dir} on {scorer.sample_rate:.0%} of micro-batches (pid {scorer._process.pid})")
+        return scorer
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def offer(self, reviews, results, primary_ms):
+        """Maybe queue a scored micro-batch; never blocks"""
+        self._count('offered')
+        if random.random() >= self.sample_rate:
+            return
+        if any(result.get('degradationLevel', 'full') != 'full' for result in results):
+            return
+        self._count('sampled')
+        if self._process.poll() is not None:
+            self._count('dropped')
+            return
+        try:
+            self._queue.put_nowait((reviews, results, primary_ms))
+        except queue.Full:
+            self._count('dropped')
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters['queue_depth'] = self._queue.qsize()
+        counters['sample_rate'] = self.sample_rate
+        counters['process_alive'] = self._process.poll() is None
+        return counters
+
+    def _feed(self):
+        # Blocks on the pipe while the shadow process is busy; offer() keeps
+        # dropping once the bounded queue behind it is full
+        while True:
+            batch = self._queue.get()
+            try:
+                pickle.dump(batch, self._process.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                print(f"Shadow process stopped: {e}")
+                return
+
+    def _read_outcomes(self):
+        for line in self._process.stdout:
+            outcome = line.decode('utf-8', 'replace').strip()
+            if outcome in ('scored', 'errors'):
+                self._count(outcome)
+
+
+def serve(models_dir, db_path, nice):
+    """Shadow process: score pickled batches from stdin with the candidate"""
+    try:
+        # Before TensorFlow starts its pools, so every thread inherits it
+        os.nice(nice)
+    except OSError:
+        pass
+    from fake_review_detector import FakeReviewDetector
+    candidate = FakeReviewDetector(models_dir, track_reviewers=False)
+    if not candidate.models:
+        print(f"Shadow models in {models_dir} failed to load; shadow mode off", file=sys.stderr)
+        return
+
+    conn = connect(db_path)
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    while True:
+        try:
+            reviews, results, primary_ms = pickle.load(stdin)
+        except EOFError:
+            return
+        try:
+            start = time.perf_counter()
+            candidate_results = candidate.process_reviews(reviews)
+            candidate_ms = (time.perf_counter() - start) * 1000
+            _store(conn, reviews, results, candidate_results, primary_ms, candidate_ms)
+            stdout.write(b'scored\n')
+        except Exception as e:
+            print(f"Error in shadow scoring: {e}", file=sys.stderr)
+            stdout.write(b'errors\n')
+        stdout.flush()
+
+
+def _store(conn, reviews, results, candidate_results, primary_ms, candidate_ms):
+    with conn:
+        batch_id = conn.execute(
+            'INSERT INTO shadow_batches (created_at, batch_size, primary_ms, candidate_ms) VALUES (?, ?, ?, ?)',
+            (time.time(), len(reviews), primary_ms, candidate_ms)
+        ).lastrowid
+        rows = []
+        for review, primary, candidate in zip(reviews, results, candidate_results):
+            comparison = compare(primary, candidate)
+            rows.append((
+                batch_id, review.get('reviewId'),
+                comparison['primary_fake'], comparison['candidate_fake'],
+                comparison['primary_confidence'], comparison['candidate_confidence'],
+                json.dumps(comparison['pattern_disagreements'])
+            ))
+        conn.executemany('INSERT INTO shadow_reviews VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+
+def report(db_path, hours=None):
+    """Summary comparing primary and candidate over the stored shadow runs"""
+    conn = connect(db_path)
+    since = time.time() - hours * 3600 if hours else 0
+    batches = conn.execute('SELECT * FROM shadow_batches WHERE created_at >= ?', (since,)).fetchall()
+    reviews = conn.execute(
+        'SELECT r.* FROM shadow_reviews r JOIN shadow_batches b ON b.id = r.batch_id WHERE b.created_at >= ?',
+        (since,)
+    ).fetchall()
+
+    total = len(reviews)
+    confusion = {'both_fake': 0, 'both_genuine': 0, 'primary_only': 0, 'candidate_only': 0}
+    pattern_disagreements = {name: 0 for name in PATTERNS}
+    confidence_delta = 0.0
+    for row in reviews:
+        if row['primary_fake'] and row['candidate_fake']:
+            confusion['both_fake'] += 1
+        elif row['primary_fake']:
+            confusion['primary_only'] += 1
+        elif row['candidate_fake']:
+            confusion['candidate_only'] += 1
+        else:
+            confusion['both_genuine'] += 1
+        for name in json.loads(row['pattern_disagreements']):
+            pattern_disagreements[name] += 1
+        confidence_delta += abs(row['primary_confidence'] - row['candidate_confidence'])
+
+    def per_review_ms(column):
+        return [row[column] / row['batch_size'] for row in batches if row['batch_size']]
+
+    latency = {}
+    for name, column in (('primary', 'primary_ms'), ('candidate', 'candidate_ms')):
+        values = per_review_ms(column)
+        latency[name] = {p: percentile(values, p) for p in (50, 95, 99)}
+
+    return {
+        'batches': len(batches),
+        'reviews': total,
+        'is_fake_agreement': (confusion['both_fake'] + confusion['both_genuine']) / total if total else None,
+        'confusion': confusion,
+        'mean_abs_confidence_delta': confidence_delta / total if total else None,
+        'pattern_disagreement_rate': {
+            name: count / total if total else None for name, count in pattern_disagreements.items()
+        },
+        'latency_ms_per_review': latency
+    }
+
+
+def print_report(summary):
+    print(f"Shadow runs: {summary['batches']} batches, {summary['reviews']} reviews")
+    if not summary['reviews']:
+        return
+    print(f"isFake agreement: {summary['is_fake_agreement']:.2%}")
+    confusion = summary['confusion']
+    print(f"  both fake {confusion['both_fake']}, both genuine {confusion['both_genuine']}, "
+          f"primary only {confusion['primary_only']}, candidate only {confusion['candidate_only']}")
+    print(f"Mean |confidence delta|: {summary['mean_abs_confidence_delta']:.4f}")
+    print("Pattern disagreement:")
+    for name, rate in summary['pattern_disagreement_rate'].items():
+        print(f"  {name:15s} {rate:.2%}")
+    print("Latency per review (ms):   p50      p95      p99")
+    for name, percentiles in summary['latency_ms_per_review'].items():
+        print(f"  {name:10s}          " + '  '.join(f"{percentiles[p]:7.2f}" for p in (50, 95, 99)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shadow scoring tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    report_parser = subparsers.add_parser('report', help='Compare primary and candidate bundles')
+    report_parser.add_argument('--db', default=os.environ.get('SHADOW_DB_PATH', './shadow.db'))
+    report_parser.add_argument('--hours', type=float, help='Only runs from the last N hours')
+    report_parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    serve_parser = subparsers.add_parser('serve', help='Shadow process started by ShadowScorer')
+    serve_parser.add_argument('--models-dir', required=True)
+    serve_parser.add_argument('--db', default=os.environ.get('SHADOW_DB_PATH', './shadow.db'))
+    serve_parser.add_argument('--nice', type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args.models_dir, args.db, args.nice)
+    elif args.command == 'report':
+        summary = report(args.db, args.hours)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print_report(summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+State files shared by every server process (gunicorn worker).
+
+Workers keep their own in-memory state and merge it into one file. locked()
+holds an exclusive flock on <path>.lock for the duration of a
+read-merge-write, and update_file() does the whole read-merge-write: the
+merged state is written to a temp file named after the process id and
+renamed over path, so readers never see a partial file and two workers
+never write the same temp file.
+"""
+
+import fcntl
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def locked(path):
+    """Exclusive lock on <path>.lock, serializing every writer of path"""
+    with open(path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def update_file(path, merge, write, tmp_suffix='.tmp'):
+    """Replace path with merge(path, or None when missing) under the lock.
+
+    write(state, tmp_path) writes the merged state; returns the state.
+    """
+    with locked(path):
+        state = merge(path if os.path.exists(path) else None)
+        tmp_path = f"{path}.{os.getpid()}{tmp_suffix}"
+        write(state, tmp_path)
+        os.replace(tmp_path, path)
+    return state
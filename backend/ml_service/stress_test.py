@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the served scoring path.
+
+Request threads submit single reviews to an InferenceScheduler, the way
+/predict/review does, so the test covers micro-batch coalescing across the
+SCHEDULER_WORKERS scoring threads rather than direct detector calls. It
+checks that every result matches a single-threaded baseline (no corrupted
+state) and reports throughput for each client thread count.
+
+    python stress_test.py --threads 1 8 32 128 256 --requests 2000 --workers 2
+
+Results scored at a degraded level (see degradation.py) legitimately differ
+from the baseline; they are counted separately instead of as mismatches.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_review_detector import FakeReviewDetector
+from scheduler import DeadlineExceeded, InferenceScheduler
+
+SAMPLE_REVIEWS = [
+    {
+        'reviewText': 'This product is amazing! I love it so much. Best purchase ever!',
+        'rating': 5,
+        'ipAddress': '192.168.1.1'
+    },
+    {
+        'reviewText': 'Great product, fast shipping, excellent quality, highly recommend, would buy again',
+        'rating': 5,
+        'ipAddress': '192.168.1.2'
+    },
+    {
+        'reviewText': 'I bought this last week and it works well. The quality is decent for the price.',
+        'rating': 4,
+        'ipAddress': '192.168.1.3'
+    },
+    {
+        'reviewText': 'Terrible. Broke after two days and support never answered my emails.',
+        'rating': 1,
+        'ipAddress': '192.168.1.4'
+    }
+]
+
+NUMERIC_KEYS = ['confidence', 'riskScore', 'reviewAuthenticity', 'burstReviewConfidence',
+                'copyPasteConfidence', 'botActivityConfidence']
+
+
+def same_result(a, b, tolerance=1e-5):
+    if a['isFake'] != b['isFake']:
+        return False
+    return all(abs(a[key] - b[key]) <= tolerance for key in NUMERIC_KEYS)
+
+
+def run(scheduler, baseline, threads, total_requests, deadline_ms):
+    """Score total_requests reviews from a pool of client threads.
+
+    Returns (seconds, mismatches, degraded, deadline misses).
+    """
+    def work(i):
+        index = i % len(SAMPLE_REVIEWS)
+        try:
+            result = scheduler.run([SAMPLE_REVIEWS[index]], 'interactive', deadline_ms)[0]
+        except DeadlineExceeded:
+            return 0, 0, 1
+        if result.get('degradationLevel', 'full') != 'full':
+            return 0, 1, 0
+        return (0 if same_result(result, baseline[index]) else 1), 0, 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(work, range(total_requests)))
+    mismatches, degraded, missed = (sum(column) for column in zip(*outcomes))
+    return time.perf_counter() - start, mismatches, degraded, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multithreaded stress test for the detector')
+    parser.add_argument('--models-dir', default='./ml_models')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32, 128, 256])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--workers', type=int, help='scheduler threads (default: SCHEDULER_WORKERS)')
+    parser.add_argument('--deadline-ms', type=float, default=60000, help='per-request interactive deadline')
+    args = parser.parse_args()
+
+    detector = FakeReviewDetector(args.models_dir)
+    baseline = [detector.process_review(review) for review in SAMPLE_REVIEWS]
+    scheduler = InferenceScheduler(detector, workers=args.workers)
+
+    print(f"{'threads':>8} {'seconds':>9} {'req/s':>9} {'speedup':>8} {'mismatches':>11} "
+          f"{'degraded':>9} {'timeouts':>9}")
+    failed = False
+    single = None
+    for threads in args.threads:
+        elapsed, mismatches, degraded, missed = run(scheduler, baseline, threads, args.requests, args.deadline_ms)
+        throughput = args.requests / elapsed
+        single = single or throughput
+        print(f"{threads:>8} {elapsed:>9.2f} {throughput:>9.1f} {throughput / single:>7.2f}x {mismatches:>11} "
+              f"{degraded:>9} {missed:>9}")
+        failed = failed or mismatches > 0
+
+    print(f"Scheduler: {scheduler.metrics()['classes']['interactive']}")
+
+    if failed:
+        print("❌ Concurrent results diverged from the single-threaded baseline")
+        sys.exit(1)
+    print("✅ All concurrent results match the single-threaded baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Unicode-aware text normalization shared by the tokenizer, pattern analysis
+and sentiment.
+
+normalize() turns a review into a NormalizedText once:
+
+* NFKC folds compatibility forms (full-width '！' becomes '!', ligatures and
+  '…' expand), then str.casefold() does full Unicode case folding,
+* curly apostrophes become "'" so "don’t" and "don't" are one word,
+* words are runs of letters/digits with inner apostrophes; CJK ideographs
+  and kana are one token per character, since those scripts do not put
+  spaces between words; emoji and punctuation are not words,
+* sentences end at . ! ? 。 ！ ？ … (one or more); sentence_starts holds
+  the first word of every sentence that has one.
+
+token_text is the words joined by single spaces. It is what the Keras
+tokenizer sees, both when fitting (extract_models.py) and at inference, so
+non-ASCII punctuation can no longer glue words together.
+
+ASCII text, which is nearly all bulk and job traffic, takes a fast path:
+str.lower() and a single byte-table translate that keeps word characters,
+turns . ! ? into '.' and everything else into spaces, after which words and
+sentence starts are plain str.split() calls; no NFKC and no regex (except
+for stray apostrophes). Only non-ASCII text goes through NFKC,
+the Unicode patterns and a small LRU cache (bot text repeats verbatim, and
+that path is several times slower); ASCII results are not cached, so bulk
+scoring does not fill the cache with texts it will never see again.
+
+Environment:
+    TEXT_NORMALIZATION_CACHE_SIZE   cached non-ASCII texts per process (default 4096)
+"""
+
+import os
+import re
+import string
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+from itertools import chain
+
+NormalizedText = namedtuple('NormalizedText', ['text', 'words', 'sentence_starts', 'token_text'])
+
+# Scripts written without spaces between words: one token per character
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+
+_WORD = f"[{_CJK}]|[^\\W_{_CJK}]+(?:'[^\\W_{_CJK}]+)*"
+_SENTENCE_END = '[.!?\u3002\uff01\uff1f\u2026]+'
+
+WORD_PATTERN = re.compile(_WORD)
+SENTENCE_END_PATTERN = re.compile(_SENTENCE_END)
+# Lower-cased ASCII: word characters and "'" kept, sentence ends become '.',
+# everything else a space
+_ASCII_TABLE = bytes(
+    c if chr(c) in string.ascii_lowercase + string.digits + "'"
+    else ord('.') if chr(c) in '.!?' else ord(' ')
+    for c in range(256)
+)
+# Apostrophes that are not between two word characters
+_STRAY_APOSTROPHE = re.compile("'(?![a-z0-9])|(?<![a-z0-9])'")
+
+
+def normalize(text):
+    """Case-folded text, words, sentence starts and tokenizer input"""
+    text = text or ''
+    if not text.isascii():
+        return _normalize_unicode(text)
+    # NFKC leaves ASCII alone and casefold() equals lower() on it
+    text = text.lower()
+    cleaned = text.encode('ascii').translate(_ASCII_TABLE).decode('ascii')
+    if "'" in cleaned:
+        cleaned = _STRAY_APOSTROPHE.sub(' ', cleaned)
+    words = cleaned.replace('.', ' ').split()
+    sentence_starts = [sentence.split(None, 1)[0] for sentence in cleaned.split('.') if sentence.strip()]
+    return NormalizedText(text, words, sentence_starts, ' '.join(words))
+
+
+@lru_cache(maxsize=int(os.environ.get('TEXT_NORMALIZATION_CACHE_SIZE', 4096)))
+def _normalize_unicode(text):
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = text.replace('\u2019', "'").replace('\u2018', "'").replace('\u02bc', "'")
+    sentences = [words for words in map(WORD_PATTERN.findall, SENTENCE_END_PATTERN.split(text)) if words]
+    words = tuple(chain.from_iterable(sentences))
+    return NormalizedText(text, words, tuple(sentence[0] for sentence in sentences), ' '.join(words))
+
+
+def token_texts(texts):
+    """Tokenizer input for a sequence of raw texts"""
+    return [normalize(text).token_text for text in texts]
+
+
+def cache_info():
+    return _normalize_unicode.cache_info()._asdict()
+
+
+def cache_clear():
+    _normalize_unicode.cache_clear()
@@ -0,0 +1,145 @@
+"""
+Opt-in per-request tracing.
+
+A request is traced when it sends `X-Profile: 1` or is picked by the
+TRACE_SAMPLE_RATE sampler. The trace is a tree of timed spans (parse, queue,
+preprocess, tokenize, one per model, rules, sentiment, serialize, ...)
+written as a Chrome Trace Event JSON file, which chrome://tracing,
+ui.perfetto.dev and speedscope open directly. The response carries the trace
+id in X-Trace-Id.
+
+The active traces live in a context variable, so span() is a cheap no-op for
+untraced requests. Scoring happens on scheduler threads and one micro-batch
+can serve several requests, so the scheduler re-activates the traces of
+every request in the batch (activate()) and batch spans are recorded into
+each of them.
+
+Environment:
+    TRACE_DIR           where trace files are written (default ./traces)
+    TRACE_SAMPLE_RATE   fraction of /predict requests traced without the header (default 0)
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+_active = contextvars.ContextVar('active_traces', default=())
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Trace:
+    """Spans recorded for one request, possibly from several threads"""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.started = time.monotonic()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end, args=None):
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': (start - self.started) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+
+    def to_chrome(self):
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event['ts'])
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+             'args': {'name': thread_names.get(tid, str(tid))}}
+            for tid in {event['tid'] for event in events}
+        ]
+        return {
+            'traceEvents': metadata + events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'traceId': self.id, 'request': self.name}
+        }
+
+    def write(self, directory=None):
+        directory = directory or os.environ.get('TRACE_DIR', './traces')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.id}.json")
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome(), f)
+        return path
+
+
+class _Span:
+    __slots__ = ('name', 'traces', 'args', 'start')
+
+    def __init__(self, name, traces, args):
+        self.name = name
+        self.traces = traces
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.monotonic()
+        for trace in self.traces:
+            trace.add(self.name, self.start, end, self.args)
+        return False
+
+
+def should_trace(header_value):
+    if header_value and header_value.lower() not in ('0', 'false', 'no'):
+        return True
+    rate = float(os.environ.get('TRACE_SAMPLE_RATE', 0))
+    return rate > 0 and random.random() < rate
+
+
+def begin(name):
+    """Start a trace in the current context; returns a token for end()"""
+    trace = Trace(name)
+    return trace, _active.set((trace,))
+
+
+def end(token):
+    _active.reset(token)
+
+
+def current():
+    """The request's trace in this context, or None"""
+    traces = _active.get()
+    return traces[0] if len(traces) == 1 else None
+
+
+def active():
+    return _active.get()
+
+
+@contextlib.contextmanager
+def activate(traces):
+    """Record spans into these traces (e.g. every request in a micro-batch)"""
+    token = _active.set(tuple(traces))
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def span(name, **args):
+    """Time a block in every active trace; a no-op when nothing is traced"""
+    traces = _active.get()
+    if not traces:
+        return _NULL_SPAN
+    return _Span(name, traces, args)
@@ -0,0 +1,332 @@
+"""
+Controlled vocabulary extension for the review models.
+
+The tokenizer is frozen at training time, so words it has never seen are
+dropped by `texts_to_sequences`. Instead of refitting the tokenizer on live
+traffic, the service only *counts* out-of-vocabulary words (OOVTracker) and
+an offline job grows the vocabulary:
+
+    python vocabulary.py extend --counts ml_models/oov_counts.json \
+        --min-count 5 --data new_reviews.csv
+
+which appends the new words to the tokenizer, allocates new embedding rows
+in every model (warm-started from the mean of the trained rows), optionally
+fine-tunes only the embeddings on labelled data, and writes the updated
+artifacts to the output directory.
+
+Each server process flushes its counts into the shared counts file every
+OOV_FLUSH_SECONDS and at exit. Flushes merge under an exclusive flock on
+<counts file>.lock, so workers flushing at the same time do not lose counts.
+
+Environment:
+    OOV_FLUSH_SECONDS   interval between background flushes (default 300, 0 disables)
+    OOV_COUNTS_PATH     counts file the server writes (default <models dir>/oov_counts.json)
+"""
+
+import argparse
+import json
+import os
+import pickle
+import threading
+import time
+
+from tensorflow.keras.preprocessing.text import text_to_word_sequence
+
+from shared_files import update_file
+from text_normalization import token_texts
+
+MODEL_FILES = {
+    'fake_review': 'fake_review.h5',
+    'burst_review': 'burst_review.h5',
+    'copy_paste_review': 'copy-paste_review.h5',
+    'likely_bot': 'likely_bot.h5'
+}
+
+# Label column used to fine-tune each model (same columns as extract_models.py)
+LABEL_COLUMNS = {
+    'fake_review': 'label',
+    'burst_review': 'burst_reviews',
+    'copy_paste_review': 'copy_paste_review',
+    'likely_bot': 'likely_bot'
+}
+
+
+class OOVTracker:
+    """Thread-safe, bounded counter of out-of-vocabulary words"""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self.counts = {}
+        self.total_observed = 0
+        self._lock = threading.Lock()
+
+    def observe(self, words):
+        """Count words that are missing from the vocabulary"""
+        if not words:
+            return
+        with self._lock:
+            self.total_observed += len(words)
+            for word in words:
+                self.counts[word] = self.counts.get(word, 0) + 1
+            if len(self.counts) > self.max_entries:
+                self._prune()
+
+    def _prune(self):
+        # Keep the most frequent half; one-off typos are the long tail
+        keep = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        self.counts = dict(keep[:self.max_entries // 2])
+
+    def most_common(self, limit=100, min_count=1):
+        """Return the most frequent OOV words as (word, count) pairs"""
+        with self._lock:
+            items = [item for item in self.counts.items() if item[1] >= min_count]
+        items.sort(key=lambda item: item[1], reverse=True)
+        return items[:limit]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'total_observed': self.total_observed,
+                'counts': dict(self.counts)
+            }
+
+    def dump(self, path):
+        """Merge the current counts into a JSON file and reset the tracker"""
+        with self._lock:
+            counts, self.counts = self.counts, {}
+            total, self.total_observed = self.total_observed, 0
+        if not counts:
+            return total
+
+        def merge(existing_path):
+            existing = load_counts(existing_path) if existing_path else {}
+            for word, count in counts.items():
+                existing[word] = existing.get(word, 0) + count
+            return existing
+
+        def write(merged, tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump({'counts': merged}, f)
+
+        # Other workers merge into the same file
+        update_file(path, merge, write)
+        return total
+
+    def start_flushing(self, path, interval_seconds=None):
+        """Dump into path every interval_seconds from a daemon thread"""
+        if interval_seconds is None:
+            interval_seconds = float(os.environ.get('OOV_FLUSH_SECONDS', 300))
+        if interval_seconds <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.dump(path)
+                except Exception as e:
+                    print(f"Error flushing OOV counts: {e}")
+
+        threading.Thread(target=run, name='oov-flush', daemon=True).start()
+
+
+def load_counts(path):
+    with open(path, 'r') as f:
+        return json.load(f).get('counts', {})
+
+
+def find_oov_words(tokenizer, text):
+    """Split text the same way the tokenizer does and return unknown words.
+
+    With num_words set, texts_to_sequences also drops words indexed at or
+    past num_words, so those count as out of vocabulary too.
+    """
+    words = text_to_word_sequence(
+        text,
+        filters=tokenizer.filters,
+        lower=tokenizer.lower,
+        split=tokenizer.split
+    )
+    word_index = tokenizer.word_index
+    num_words = tokenizer.num_words
+    if num_words is None:
+        return [word for word in words if word not in word_index]
+    return [word for word in words if word_index.get(word, num_words) >= num_words]
+
+
+def extend_tokenizer(tokenizer, new_words):
+    """Append new words to the tokenizer, keeping existing indices stable.
+
+    With num_words set, entries at or past num_words were never used by the
+    models; they are dropped so that new words take the indices right after
+    the trained vocabulary and num_words covers exactly the trained words
+    plus the added ones.
+    """
+    if tokenizer.num_words is not None:
+        for word, index in list(tokenizer.word_index.items()):
+            if index >= tokenizer.num_words:
+                del tokenizer.word_index[word]
+                tokenizer.index_word.pop(index, None)
+
+    added = []
+    next_index = max(tokenizer.word_index.values(), default=0) + 1
+    for word in new_words:
+        if word in tokenizer.word_index:
+            continue
+        tokenizer.word_index[word] = next_index
+        tokenizer.index_word[next_index] = word
+        tokenizer.word_counts[word] = 0
+        tokenizer.word_docs[word] = 0
+        added.append(word)
+        next_index += 1
+    if tokenizer.num_words is not None:
+        tokenizer.num_words = next_index
+    return added
+
+
+def expand_embeddings(model, vocab_size, first_new_row=None):
+    """Rebuild a model with an embedding table of vocab_size rows.
+
+    Rows below first_new_row (default: the current table size) are copied
+    unchanged; the rest are initialised to the mean of the trained rows so
+    unseen words start from a neutral point instead of random noise.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    config = model.get_config()
+    for layer_config in config['layers']:
+        if layer_config['class_name'] == 'Embedding':
+            layer_config['config']['input_dim'] = vocab_size
+
+    new_model = tf.keras.Model.from_config(config)
+    for old_layer, new_layer in zip(model.layers, new_model.layers):
+        weights = old_layer.get_weights()
+        if isinstance(old_layer, tf.keras.layers.Embedding):
+            table = weights[0]
+            trained_rows = min(first_new_row or table.shape[0], table.shape[0], vocab_size)
+            extra_rows = vocab_size - trained_rows
+            table = table[:trained_rows]
+            if extra_rows > 0:
+                init = np.repeat(table[1:].mean(axis=0, keepdims=True), extra_rows, axis=0)
+                table = np.vstack([table, init])
+            weights = [table]
+        new_layer.set_weights(weights)
+    return new_model
+
+
+def fine_tune_embeddings(model, X_text, X_extra, y, epochs=2, batch_size=32):
+    """Train only the embedding table; every other layer stays frozen"""
+    import tensorflow as tf
+
+    for layer in model.layers:
+        layer.trainable = isinstance(layer, tf.keras.layers.Embedding)
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    model.fit([X_text, X_extra], y, epochs=epochs, batch_size=batch_size, validation_split=0.2)
+    for layer in model.layers:
+        layer.trainable = True
+    return model
+
+
+def _label_array(data, column):
+    import numpy as np
+
+    values = data[column].astype(str).str.lower()
+    return np.array(values.isin(['1', 'true', 'fake']), dtype='int64')
+
+
+def extend_vocabulary(models_dir, output_dir, counts_path, min_count=5, max_new_words=5000,
+                      data_path=None, epochs=2):
+    """Offline job: grow the vocabulary and warm-start the new embedding rows"""
+    import numpy as np
+    import pandas as pd
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.preprocessing.sequence import pad_sequences
+
+    with open(os.path.join(models_dir, 'tokenizer.pkl'), 'rb') as f:
+        tokenizer = pickle.load(f)
+    with open(os.path.join(models_dir, 'scaler.pkl'), 'rb') as f:
+        scaler = pickle.load(f)
+    with open(os.path.join(models_dir, 'max_length.txt'), 'r') as f:
+        max_length = int(f.read().strip())
+
+    counts = load_counts(counts_path)
+    candidates = sorted(
+        (word for word, count in counts.items() if count >= min_count),
+        key=lambda word: counts[word],
+        reverse=True
+    )[:max_new_words]
+
+    added = extend_tokenizer(tokenizer, candidates)
+    if not added:
+        print("No words reached the minimum count; nothing to do.")
+        return []
+    vocab_size = max(tokenizer.word_index.values()) + 1
+    first_new_row = tokenizer.word_index[added[0]]
+    print(f"Adding {len(added)} words (vocabulary size {vocab_size})")
+
+    training = None
+    if data_path:
+        data = pd.read_csv(data_path)
+        X_text = pad_sequences(tokenizer.texts_to_sequences(token_texts(data['review_text'])), maxlen=max_length)
+        if {'time_diff', 'ip_count'}.issubset(data.columns):
+            X_extra = scaler.transform(data[['time_diff', 'ip_count']])
+        else:
+            X_extra = np.zeros((len(data), 2))
+        training = (data, X_text, X_extra)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, filename in MODEL_FILES.items():
+        model = expand_embeddings(
+            load_model(os.path.join(models_dir, filename)), vocab_size, first_new_row
+        )
+        if training is not None and LABEL_COLUMNS[name] in training[0].columns:
+            data, X_text, X_extra = training
+            print(f"Fine-tuning embeddings for {name}...")
+            fine_tune_embeddings(model, X_text, X_extra, _label_array(data, LABEL_COLUMNS[name]), epochs=epochs)
+        model.save(os.path.join(output_dir, filename))
+        print(f"Saved {filename}")
+
+    with open(os.path.join(output_dir, 'tokenizer.pkl'), 'wb') as f:
+        pickle.dump(tokenizer, f)
+    with open(os.path.join(output_dir, 'scaler.pkl'), 'wb') as f:
+        pickle.dump(scaler, f)
+    with open(os.path.join(output_dir, 'max_length.txt'), 'w') as f:
+        f.write(str(max_length))
+
+    print(f"Extended artifacts written to {output_dir}/")
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and extend the review model vocabulary')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    top = subparsers.add_parser('top', help='Show the most frequent OOV words')
+    top.add_argument('--counts', default='./ml_models/oov_counts.json')
+    top.add_argument('--limit', type=int, default=50)
+
+    extend = subparsers.add_parser('extend', help='Add frequent OOV words and warm-start their embeddings')
+    extend.add_argument('--models-dir', default='./ml_models')
+    extend.add_argument('--output-dir', default='./ml_models_extended')
+    extend.add_argument('--counts', default='./ml_models/oov_counts.json')
+    extend.add_argument('--min-count', type=int, default=5)
+    extend.add_argument('--max-new-words', type=int, default=5000)
+    extend.add_argument('--data', help='CSV with review_text and label columns for fine-tuning')
+    extend.add_argument('--epochs', type=int, default=2)
+
+    args = parser.parse_args()
+    if args.command == 'top':
+        counts = load_counts(args.counts)
+        for word, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:args.limit]:
+            print(f"{count:8d}  {word}")
+    else:
+        extend_vocabulary(
+            args.models_dir, args.output_dir, args.counts,
+            min_count=args.min_count, max_new_words=args.max_new_words,
+            data_path=args.data, epochs=args.epochs
+        )
+
+
+if __name__ == "__main__":
+    main()